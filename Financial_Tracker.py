@@ -1,60 +1,216 @@
-def forecast_expenses(months_ahead: int = 3):
-    expense_data = load_expenses()
-    if expense_data.empty:
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+import db
+from queries import monthly_category_totals
+
+
+def forecast_expenses(months_ahead: int = 3, chart_path: str = "forecast.png"):
+    import charts
+    from forecasting import TOTAL_SERIES, forecast_all
+
+    # Month-level totals come straight from the monthly_rollup table
+    matrix = monthly_category_totals()
+    if matrix.empty:
         print("\nNo expenses recorded yet to forecast.")
         return
 
     print("\n--- Expense Forecast ---")
 
-    expense_data["Month"] = expense_data["Date"].dt.to_period("M")
-    monthly_totals = (
-        expense_data.groupby("Month")["Amount"].sum().reset_index()
-    )
-    monthly_totals["Month"] = monthly_totals["Month"].dt.to_timestamp()
-    monthly_totals["Month_Index"] = np.arange(len(monthly_totals))
+    result = forecast_all(matrix, months_ahead)
+    total_metrics = result.metrics.loc[TOTAL_SERIES]
+    future_expenses = result.forecast[TOTAL_SERIES]
+
+    print(f"Train R²: {total_metrics['Train_R2']:.3f}")
+    if result.test_months:
+        print(f"Test MAE (last {result.test_months} months): ${total_metrics['Test_MAE']:,.2f}")
+
+    print(f"\nPredicted expenses for the next {months_ahead} months:")
+    for i, expense in enumerate(future_expenses, 1):
+        print(f"Month {i}: ${expense:.2f}")
+
+    print("\nPer-category forecast:")
+    print(result.forecast.drop(columns=TOTAL_SERIES).set_index("Month_Index").round(2).to_string())
+
+    # Rendered off-screen, so this works on servers and in cron jobs
+    with open(chart_path, "wb") as fh:
+        fh.write(charts.forecast_chart(result.history, result.forecast, TOTAL_SERIES))
+    print(f"\nSaved the forecast chart to {chart_path}.")
 
-    X = monthly_totals[["Month_Index"]].values
-    y = monthly_totals["Amount"].values
 
-    if len(monthly_totals) < 4:
-        # Too few points for meaningful train/test split, fall back to simple fit
-        model = LinearRegression()
-        model.fit(X, y)
-        train_r2 = model.score(X, y)
-        test_mae = None
+def backtest_models(months_ahead: int, horizon: Optional[int], workers: Optional[int]):
+    from backtesting import MAX_HORIZON, backtest
+    from forecasting import TOTAL_SERIES
+
+    matrix = monthly_category_totals()
+    if matrix.empty:
+        print("\nNo expenses recorded yet to backtest.")
+        return
+
+    started = time.perf_counter()
+    result = backtest(matrix, horizon or MAX_HORIZON, workers)
+    elapsed = time.perf_counter() - started
+    if not result.folds:
+        print("\nNot enough history to backtest; forecasting with a linear trend.")
+    else:
+        print(f"\n--- Backtest ({result.folds} rolling origins, {elapsed:.2f}s) ---")
+        print("\nMAE by months ahead, all categories:")
+        print(result.horizon_mae().round(2).to_string())
+        print("\nMAE over all horizons, per series:")
+        print(result.summary.round(2).assign(Best=result.best).to_string())
+
+    print(f"\nForecast for the next {months_ahead} months, best model per series:")
+    forecast = result.forecast(months_ahead).set_index("Month_Index")
+    print(forecast.round(2).to_string())
+    print(f"\nTotal: best model {result.best[TOTAL_SERIES]}.")
+
+
+def run_export(args) -> int:
+    from export import write_export
+    from queries import ExpenseFilters
+
+    filters = ExpenseFilters(
+        start=args.start,
+        end=args.end,
+        categories=tuple(args.category or ()),
+        sources=tuple(args.source or ()),
+    )
+    started = time.perf_counter()
+    if args.output == "-":
+        rows = write_export(sys.stdout.buffer, args.format, filters)
     else:
-        # Use all but last 3 months for training, last up to 3 months as test
-        split_idx = max(1, len(monthly_totals) - 3)
-        X_train, X_test = X[:split_idx], X[split_idx:]
-        y_train, y_test = y[:split_idx], y[split_idx:]
-
-        model = LinearRegression()
-        model.fit(X_train, y_train)
-        train_r2 = model.score(X_train, y_train)
-
-        if len(X_test) > 0:
-            y_pred_test = model.predict(X_test)
-            test_mae = np.mean(np.abs(y_test - y_pred_test))
+        with open(args.output, "wb") as fh:
+            rows = write_export(fh, args.format, filters)
+    elapsed = time.perf_counter() - started
+    print(f"Exported {rows:,} expenses in {elapsed:.1f}s.", file=sys.stderr)
+    return 0
+
+
+def date_arg(text: str) -> str:
+    try:
+        time.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {text!r}")
+    return text
+
+
+def month_arg(text: str) -> str:
+    try:
+        time.strptime(text, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {text!r}")
+    return text
+
+
+def run_reports(args) -> int:
+    from reports import ReportSpec, default_output_path, generate_reports
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    specs = [
+        ReportSpec(
+            db_path=path,
+            kind=kind,
+            start_month=args.start,
+            end_month=args.end,
+            output_path=default_output_path(
+                args.out_dir, path, kind, args.start, args.end, args.format
+            ),
+            fmt=args.format,
+            months_ahead=args.months_ahead,
+        )
+        for path in args.db or [db.DB_FILE]
+        for kind in args.kind or ["monthly"]
+    ]
+    started = time.perf_counter()
+    results = generate_reports(specs, args.workers)
+    failures = 0
+    for spec, outcome in results.items():
+        if isinstance(outcome, Exception):
+            failures += 1
+            print(f"FAILED {spec.ledger} {spec.kind}: {outcome}", file=sys.stderr)
         else:
-            test_mae = None
+            print(f"Wrote {outcome}")
+    elapsed = time.perf_counter() - started
+    print(f"{len(specs) - failures} of {len(specs)} reports in {elapsed:.1f}s.")
+    return 1 if failures else 0
 
-    future_indices = np.arange(len(monthly_totals), len(monthly_totals) + months_ahead).reshape(-1, 1)
-    future_expenses = model.predict(future_indices)
 
-    print(f"Train R²: {train_r2:.3f}")
-    if test_mae is not None:
-        print(f"Test MAE (last {len(X_test)} months): ${test_mae:,.2f}")
+def main():
+    from export import EXPORT_FORMATS
+    from reports import DEFAULT_MONTHS_AHEAD, REPORT_FORMATS, REPORT_KINDS
+
+    parser = argparse.ArgumentParser(description="Expense tracker command line")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    forecast_parser = sub.add_parser("forecast", help="print a forecast and save its chart")
+    forecast_parser.add_argument("--db", default=db.DB_FILE, help="path to the SQLite database")
+    forecast_parser.add_argument("--months", type=int, default=DEFAULT_MONTHS_AHEAD)
+    forecast_parser.add_argument("--chart", default="forecast.png")
+
+    backtest_parser = sub.add_parser(
+        "backtest", help="compare forecast models on rolling origins and forecast with the best"
+    )
+    backtest_parser.add_argument("--db", default=db.DB_FILE, help="path to the SQLite database")
+    backtest_parser.add_argument("--months", type=int, default=DEFAULT_MONTHS_AHEAD)
+    backtest_parser.add_argument("--horizon", type=int, help="months ahead to score (default 12)")
+    backtest_parser.add_argument(
+        "--workers", type=int, help="processes to use (default: a pool only for long histories)"
+    )
+
+    export_parser = sub.add_parser(
+        "export", help="stream expenses to CSV, JSON Lines or Parquet"
+    )
+    export_parser.add_argument("--db", default=db.DB_FILE, help="path to the SQLite database")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export_parser.add_argument("--output", default="-", help="file to write (default stdout)")
+    export_parser.add_argument("--from", dest="start", type=date_arg, help="first day, YYYY-MM-DD")
+    export_parser.add_argument("--to", dest="end", type=date_arg, help="last day, YYYY-MM-DD")
+    export_parser.add_argument("--category", action="append", help="repeat for several")
+    export_parser.add_argument("--source", action="append", help="repeat for several")
+
+    report_parser = sub.add_parser(
+        "report", help="render reports for one or more ledgers, in parallel"
+    )
+    report_parser.add_argument(
+        "--db", action="append", help="ledger database; repeat for several (default expenses.db)"
+    )
+    report_parser.add_argument(
+        "--kind", action="append", choices=REPORT_KINDS, help="repeat for several (default monthly)"
+    )
+    report_parser.add_argument(
+        "--from", dest="start", type=month_arg, required=True, help="first month, YYYY-MM"
+    )
+    report_parser.add_argument(
+        "--to", dest="end", type=month_arg, required=True, help="last month, YYYY-MM"
+    )
+    report_parser.add_argument("--format", choices=REPORT_FORMATS, default="pdf")
+    report_parser.add_argument("--out-dir", default="reports")
+    report_parser.add_argument("--months-ahead", type=int, default=DEFAULT_MONTHS_AHEAD)
+    report_parser.add_argument(
+        "--workers", type=int, help="processes to use (default: one per report, up to CPUs)"
+    )
+    args = parser.parse_args()
+
+    if args.command == "forecast":
+        db.DB_FILE = args.db
+        db.init_db()
+        forecast_expenses(args.months, args.chart)
+    elif args.command == "backtest":
+        db.DB_FILE = args.db
+        db.init_db()
+        backtest_models(args.months, args.horizon, args.workers)
+    elif args.command == "export":
+        db.DB_FILE = args.db
+        db.init_db()
+        sys.exit(run_export(args))
+    else:
+        if args.start > args.end:
+            parser.error("--from must not be after --to")
+        sys.exit(run_reports(args))
 
-    print(f"\nPredicted expenses for the next {months_ahead} months:")
-    for i, expense in enumerate(future_expenses, 1):
-        print(f"Month {i}: ${expense:.2f}")
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(monthly_totals["Month_Index"], y, label="Historical", marker="o")
-    plt.plot(future_indices.flatten(), future_expenses, label="Forecast", linestyle="--", marker="o")
-    plt.xlabel("Month Index")
-    plt.ylabel("Total Expenses")
-    plt.title("Expense Forecast")
-    plt.legend()
-    plt.tight_layout()
-    plt.show()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Rolling-origin backtests for choosing a forecast model per series.
+
+Every origin (fold) trains on the months before it and forecasts up to
+``MAX_HORIZON`` months ahead; absolute errors are averaged per model,
+series and horizon. Folds are independent, so (model, block of folds)
+tasks are spread over a process pool once the search is big enough to pay
+for starting one. ``best_models`` memoizes the outcome on the data
+version: the Forecast page only pays for the search after a write.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from db import snapshot_cache
+from forecasting import TOTAL_SERIES, fit_linear_trend, predict_linear_trend, with_total
+
+MAX_HORIZON = 12
+# The first origin trains on this many months
+MIN_TRAIN_MONTHS = 6
+SEASON_LENGTH = 12
+MOVING_AVERAGE_MONTHS = 3
+SMOOTHING_ALPHA = 0.3
+# Below this many model fits the search takes milliseconds and a process
+# pool would only add its start-up time.
+PARALLEL_MIN_FITS = 2000
+
+DEFAULT_MODEL = "Linear trend"
+
+
+# ---------- Models ----------
+# Each takes a months x series training matrix and returns horizon x series
+# predictions, fitting every series at once.
+
+def linear_trend(Y: np.ndarray, horizon: int) -> np.ndarray:
+    n = len(Y)
+    coef = fit_linear_trend(np.arange(n, dtype=float), Y)
+    return predict_linear_trend(coef, np.arange(n, n + horizon, dtype=float))
+
+
+def seasonal_naive(Y: np.ndarray, horizon: int) -> np.ndarray:
+    # Same month last year; plain last value until there is a full year
+    n = len(Y)
+    if n < SEASON_LENGTH:
+        return np.repeat(Y[-1:], horizon, axis=0)
+    return Y[n - SEASON_LENGTH + np.arange(horizon) % SEASON_LENGTH]
+
+
+def moving_average(Y: np.ndarray, horizon: int) -> np.ndarray:
+    return np.repeat(Y[-MOVING_AVERAGE_MONTHS:].mean(axis=0, keepdims=True), horizon, axis=0)
+
+
+def exponential_smoothing(Y: np.ndarray, horizon: int) -> np.ndarray:
+    # Simple exponential smoothing: a flat forecast at the last level
+    level = Y[0].astype(float)
+    for row in Y[1:]:
+        level = SMOOTHING_ALPHA * row + (1 - SMOOTHING_ALPHA) * level
+    return np.repeat(level[None, :], horizon, axis=0)
+
+
+MODELS: Dict[str, Callable[[np.ndarray, int], np.ndarray]] = {
+    DEFAULT_MODEL: linear_trend,
+    "Seasonal naive": seasonal_naive,
+    "Moving average": moving_average,
+    "Exponential smoothing": exponential_smoothing,
+}
+
+
+# ---------- Backtest ----------
+
+def score_origins(model: str, Y: np.ndarray, origins: List[int], max_horizon: int) -> tuple:
+    """Absolute error sums (horizon x series) and fold counts (horizon,)."""
+    fit = MODELS[model]
+    error_sums = np.zeros((max_horizon, Y.shape[1]))
+    folds = np.zeros(max_horizon, dtype=np.int64)
+    for origin in origins:
+        horizon = min(max_horizon, len(Y) - origin)
+        error_sums[:horizon] += np.abs(Y[origin : origin + horizon] - fit(Y[:origin], horizon))
+        folds[:horizon] += 1
+    return error_sums, folds
+
+
+@dataclass
+class BacktestResult:
+    history: pd.DataFrame  # month x series, with a Month_Index column
+    scores: pd.DataFrame  # Series, Model, Horizon, MAE, Folds
+    summary: pd.DataFrame  # series x model, MAE averaged over horizons
+    best: pd.Series  # series -> model
+
+    @property
+    def folds(self) -> int:
+        return int(self.scores["Folds"].max()) if not self.scores.empty else 0
+
+    def horizon_mae(self, series: str = TOTAL_SERIES) -> pd.DataFrame:
+        """Horizon x model MAE for one series."""
+        rows = self.scores[self.scores["Series"] == series]
+        table = rows.pivot(index="Horizon", columns="Model", values="MAE")
+        table = table.reindex(columns=[model for model in MODELS if model in table])
+        return table.rename_axis(columns=None)
+
+    def forecast(self, months_ahead: int) -> pd.DataFrame:
+        """Each series forecast by its best model, fit on the full history."""
+        Y = self.history.drop(columns="Month_Index").to_numpy(dtype=float)
+        n = len(Y)
+        forecast = pd.DataFrame(index=range(months_ahead), columns=self.best.index, dtype=float)
+        for model, series in self.best.groupby(self.best).groups.items():
+            columns = [self.history.columns.get_loc(name) - 1 for name in series]
+            forecast[list(series)] = MODELS[model](Y[:, columns], months_ahead)
+        forecast.insert(0, "Month_Index", np.arange(n, n + months_ahead))
+        return forecast
+
+
+def backtest(
+    matrix: pd.DataFrame, max_horizon: int = MAX_HORIZON, workers: Optional[int] = None
+) -> BacktestResult:
+    """Score every model with rolling-origin cross-validation.
+
+    ``matrix`` is a month x category frame of totals (see
+    ``queries.monthly_category_totals``); the total is scored too. With
+    ``workers`` unset the pool is used only for large searches.
+    """
+    history = with_total(matrix)
+    Y = history.to_numpy(dtype=float)
+    origins = list(range(MIN_TRAIN_MONTHS, len(Y)))
+    history.insert(0, "Month_Index", np.arange(len(Y)))
+
+    if workers is None:
+        fits = len(origins) * len(MODELS)
+        workers = (os.cpu_count() or 1) if fits >= PARALLEL_MIN_FITS else 1
+    blocks = [list(block) for block in np.array_split(origins, max(1, workers)) if len(block)]
+    tasks = [(model, Y, block, max_horizon) for model in MODELS for block in blocks]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            parts = list(pool.map(score_origins, *zip(*tasks)))
+    else:
+        parts = [score_origins(*task) for task in tasks]
+
+    totals: Dict[str, tuple] = {}
+    for (model, *_), (error_sums, folds) in zip(tasks, parts):
+        previous = totals.get(model)
+        if previous is not None:
+            error_sums, folds = previous[0] + error_sums, previous[1] + folds
+        totals[model] = (error_sums, folds)
+
+    frames = []
+    for model, (error_sums, folds) in totals.items():
+        scored = folds > 0
+        mae = error_sums[scored] / folds[scored, None]
+        frame = pd.DataFrame(mae, columns=history.columns[1:])
+        frame["Horizon"] = np.flatnonzero(scored) + 1
+        frame["Folds"] = folds[scored]
+        frames.append(
+            frame.melt(id_vars=["Horizon", "Folds"], var_name="Series", value_name="MAE")
+            .assign(Model=model)
+        )
+    columns = ["Series", "Model", "Horizon", "MAE", "Folds"]
+    scores = pd.concat(frames, ignore_index=True)[columns] if frames else pd.DataFrame(columns=columns)
+
+    if scores.empty:
+        summary = pd.DataFrame(index=history.columns[1:], columns=list(MODELS), dtype=float)
+        best = pd.Series(DEFAULT_MODEL, index=history.columns[1:])
+    else:
+        summary = scores.pivot_table(index="Series", columns="Model", values="MAE", aggfunc="mean")
+        summary = summary.reindex(index=history.columns[1:], columns=list(MODELS))
+        summary.index.name = summary.columns.name = None
+        best = summary.idxmin(axis=1)
+    return BacktestResult(history, scores, summary, best)
+
+
+@snapshot_cache.memoize
+def best_models(max_horizon: int = MAX_HORIZON, workers: Optional[int] = None) -> BacktestResult:
+    """``backtest`` over the whole ledger, cached until the next write."""
+    from queries import monthly_category_totals
+
+    return backtest(monthly_category_totals(), max_horizon, workers)
@@ -0,0 +1,82 @@
+"""Compare the rule matcher with the original if-chain auto_category.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_categorize --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from categorize import DEFAULT_RULES, CategoryMatcher
+
+MERCHANTS = [
+    "UBER *TRIP", "LYFT RIDE", "CITY TAXI", "STARBUCKS #1234", "JOE'S COFFEE",
+    "WALMART SUPERCENTER", "FRESH GROCERY", "SUPERMARKET 24", "MONTHLY RENT",
+    "NETFLIX.COM", "SPOTIFY USA", "SUBSCRIPTION BOX", "GOLD'S GYM",
+    "FITNESS FIRST", "AMAZON MKTPLACE", "SHELL OIL", "CVS PHARMACY",
+]
+
+
+def legacy_auto_category(description: str) -> str:
+    # The if-chain auto_category used before the rules engine.
+    if not isinstance(description, str):
+        return "Uncategorized"
+
+    desc = description.upper()
+    if "UBER" in desc or "LYFT" in desc or "TAXI" in desc:
+        return "Transport"
+    if "STARBUCKS" in desc or "COFFEE" in desc:
+        return "Coffee"
+    if "WALMART" in desc or "GROCERY" in desc or "SUPERMARKET" in desc:
+        return "Groceries"
+    if "RENT" in desc:
+        return "Rent"
+    if "NETFLIX" in desc or "SPOTIFY" in desc or "SUBSCRIPTION" in desc:
+        return "Subscriptions"
+    if "GYM" in desc or "FITNESS" in desc:
+        return "Fitness"
+    return "Uncategorized"
+
+
+def make_descriptions(rows: int, distinct: int, seed: int = 0) -> pd.Series:
+    # Bank exports repeat a limited set of merchant strings with store or
+    # reference numbers attached.
+    rng = np.random.default_rng(seed)
+    vocabulary = [
+        f"{MERCHANTS[i % len(MERCHANTS)]} {i:05d}" for i in range(distinct)
+    ]
+    return pd.Series(np.array(vocabulary, dtype=object)[rng.integers(0, distinct, rows)])
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=20_000)
+    args = parser.parse_args()
+
+    descriptions = make_descriptions(args.rows, args.distinct)
+
+    legacy, legacy_s = timed(lambda: descriptions.map(legacy_auto_category))
+    matcher = CategoryMatcher(DEFAULT_RULES)
+    engine, engine_s = timed(lambda: matcher.classify_column(descriptions))
+    _, warm_s = timed(lambda: matcher.classify_column(descriptions))
+
+    mismatches = int((legacy != engine).sum())
+    print(f"rows={args.rows:,} distinct={args.distinct:,}")
+    print(f"legacy if-chain    : {legacy_s:8.3f}s  ({args.rows / legacy_s:,.0f} rows/s)")
+    print(f"matcher (cold memo): {engine_s:8.3f}s  ({args.rows / engine_s:,.0f} rows/s)")
+    print(f"matcher (warm memo): {warm_s:8.3f}s  ({args.rows / warm_s:,.0f} rows/s)")
+    print(f"mismatches vs legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Check the cold-import cost of the entry points against a time budget.
+
+Each target is imported in a fresh interpreter under ``python -X importtime``;
+the cumulative time of its top-level imports, minus that of a bare interpreter
+start, is compared with its budget.
+Heavy libraries that must stay lazy are reported if they were loaded anyway.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in milliseconds. They cover our own modules plus whatever they pull
+# in eagerly; streamlit itself is counted for the app script.
+BUDGETS_MS = {
+    "db": 40,
+    "queries": 40,
+    "Financial_Tracker": 40,
+    "expense_tracker_app.py": 800,
+}
+MUST_STAY_LAZY = ("pandas", "matplotlib", "sklearn")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(target: str, cwd: str):
+    if not target:
+        code = "pass"
+    elif target.endswith(".py"):
+        # Run the Streamlit script in bare mode; it renders the default page.
+        code = f"import runpy; runpy.run_path({os.path.join(REPO_ROOT, target)!r})"
+    else:
+        code = f"import {target}"
+    code += f"; import sys; print(sorted(m for m in {MUST_STAY_LAZY!r} if m in sys.modules))"
+
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Only top-level entries; nested ones are already in their parent's total.
+        if match and not match.group(3):
+            total_us += int(match.group(2))
+    loaded = proc.stdout.strip().splitlines()[-1]
+    return total_us / 1000.0, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        baseline_ms = min(measure("", cwd)[0] for _ in range(args.repeat))
+        for target, budget in BUDGETS_MS.items():
+            runs = [measure(target, cwd) for _ in range(args.repeat)]
+            best_ms = min(ms for ms, _ in runs) - baseline_ms
+            loaded = runs[0][1]
+            ok = best_ms <= budget and loaded == "[]"
+            failed |= not ok
+            print(
+                f"{'ok  ' if ok else 'FAIL'} {target:<24} {best_ms:8.1f} ms"
+                f" (budget {budget} ms)  heavy modules loaded: {loaded}"
+            )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
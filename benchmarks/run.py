@@ -0,0 +1,375 @@
+"""Benchmark suite over synthetic ledgers of several sizes.
+
+Times the core helpers and page computations against a freshly generated
+database per size and writes the results as JSON. Each case runs in its own
+child process, so besides throughput and tracemalloc's peak (Python objects
+only) it reports the child's max RSS, which also sees SQLite's page cache
+and temp B-trees. ``compare`` flags time and max RSS regressions between
+two result files.
+
+    python -m benchmarks.run --sizes 10k,1m --output results.json
+    python -m benchmarks.run compare baseline.json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import db
+import import_jobs
+import queries
+from benchmarks.synthetic import fill_database, generate_chunks, write_statement_csv
+from categorize import DEFAULT_RULES, CategoryMatcher
+from export import write_export
+from backtesting import backtest
+from forecasting import forecast_all
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+# Imports and classification are measured on at most this many rows per size.
+MAX_IMPORT_ROWS = 1_000_000
+DEFAULT_THRESHOLD = 0.20
+# Threads and writes per thread for the concurrent add_expense case
+CONCURRENT_WRITERS = 8
+WRITES_PER_WRITER = 50
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+MAXRSS_BYTES = 1 if sys.platform == "darwin" else 1024
+# Smaller max RSS changes are noise (allocator and import differences)
+RSS_MIN_REGRESSION_MB = 16.0
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def measure(fn: Callable, repeat: int) -> Dict[str, float]:
+    """Best wall time over ``repeat`` runs, and peak traced memory of one run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2**20}
+
+
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_BYTES / 2**20
+
+
+def input_paths(rows: int, workdir: str) -> tuple:
+    """(statement CSV, database it was already imported into) for a size."""
+    sample = min(rows, MAX_IMPORT_ROWS)
+    return (
+        os.path.join(workdir, f"statement_{sample}.csv"),
+        os.path.join(workdir, f"reimport_{rows}.db"),
+    )
+
+
+def import_statement(csv_path: str, path: str, workdir: str):
+    main_db, db.DB_FILE = db.DB_FILE, path
+    main_staging, import_jobs.STAGING_DIR = import_jobs.STAGING_DIR, workdir
+    try:
+        db.init_db()
+        # The app's path: stage the file as a job, then run it here
+        with open(csv_path, "rb") as fh:
+            job_id = import_jobs.create_job(fh, "statement.csv", "Date", "Amount", "Description")
+        import_jobs.run_job(job_id)
+    finally:
+        db.DB_FILE = main_db
+        import_jobs.STAGING_DIR = main_staging
+
+
+def write_inputs(rows: int, workdir: str):
+    """Write the files the import cases read, once per size."""
+    csv_path, reimport_path = input_paths(rows, workdir)
+    write_statement_csv(csv_path, min(rows, MAX_IMPORT_ROWS))
+    # Re-importing the same statement: every row is a fingerprint duplicate
+    import_statement(csv_path, reimport_path, workdir)
+
+
+def bench_cases(
+    rows: int, workdir: str, only: Optional[Sequence[str]] = None
+) -> Dict[str, tuple]:
+    """Map case name -> (callable, items processed per call).
+
+    In-memory inputs are built only for the cases in ``only`` (all when
+    None), so a case run alone holds just its own; files come from
+    ``write_inputs``.
+    """
+
+    def wanted(*names):
+        return only is None or any(name in only for name in names)
+
+    sample = min(rows, MAX_IMPORT_ROWS)
+    csv_path, reimport_path = input_paths(rows, workdir)
+    descriptions = matrix = deep_cursor = None
+    if wanted("categorize_column"):
+        descriptions = next(generate_chunks(sample, chunk=sample))["Description"]
+    if wanted("forecast_all", "backtest"):
+        matrix = queries.monthly_category_totals.uncached()
+    if wanted("browse_page_21"):
+        for _ in range(20):
+            _, deep_cursor = queries.browse_expenses(after=deep_cursor)
+
+    def import_into_scratch():
+        import_statement(
+            csv_path, os.path.join(workdir, f"import_{time.perf_counter_ns()}.db"), workdir
+        )
+
+    def concurrent_adds():
+        def add_many():
+            for _ in range(WRITES_PER_WRITER):
+                db.add_expense("2020-06-15", "Dining", 12.5)
+
+        threads = [threading.Thread(target=add_many) for _ in range(CONCURRENT_WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def export_to_null(fmt):
+        with open(os.devnull, "wb") as fh:
+            write_export(fh, fmt)
+
+    return {
+        "load_budgets": (db.load_budgets.uncached, 1),
+        "total_spent": (queries.total_spent.uncached, rows),
+        "category_totals": (queries.category_totals.uncached, rows),
+        "category_totals_range": (
+            lambda: queries.category_totals.uncached("2019-01-01", "2019-12-31"),
+            rows,
+        ),
+        "monthly_totals": (queries.monthly_totals.uncached, rows),
+        "monthly_category_totals": (queries.monthly_category_totals.uncached, rows),
+        "daily_totals": (queries.daily_totals.uncached, rows),
+        "budget_vs_actual": (queries.budget_vs_actual.uncached, rows),
+        "budget_vs_actual_range": (
+            lambda: queries.budget_vs_actual.uncached("2019-01-15", "2019-03-10"),
+            rows,
+        ),
+        "budget_vs_actual_by_month": (
+            lambda: queries.budget_vs_actual_by_month.uncached(2019),
+            rows,
+        ),
+        "browse_first_page": (queries.browse_expenses, queries.BROWSE_PAGE_SIZE),
+        "browse_page_21": (
+            lambda: queries.browse_expenses(after=deep_cursor),
+            queries.BROWSE_PAGE_SIZE,
+        ),
+        "add_expense": (lambda: db.add_expense("2020-06-15", "Dining", 12.5), 1),
+        "add_expense_concurrent": (concurrent_adds, CONCURRENT_WRITERS * WRITES_PER_WRITER),
+        "forecast_all": (lambda: forecast_all(matrix, 12), getattr(matrix, "size", 0)),
+        "backtest": (lambda: backtest(matrix), getattr(matrix, "size", 0)),
+        "categorize_column": (
+            lambda: CategoryMatcher(DEFAULT_RULES).classify_column(descriptions),
+            sample,
+        ),
+        "export_csv": (lambda: export_to_null("csv"), rows),
+        "export_parquet": (lambda: export_to_null("parquet"), rows),
+        "import_csv": (import_into_scratch, sample),
+        "import_csv_duplicates": (
+            lambda: import_statement(csv_path, reimport_path, workdir),
+            sample,
+        ),
+    }
+
+
+def run_case(name: str, rows: int, path: str, workdir: str, repeat: int) -> dict:
+    db.DB_FILE = path
+    db.init_db()
+    fn, items = bench_cases(rows, workdir, only=[name])[name]
+    # Imports and the case's inputs set the floor the case is measured from
+    floor = max_rss_mb()
+    stats = measure(fn, repeat)
+    rss = max_rss_mb()
+    stats.update(
+        name=name,
+        rows=rows,
+        throughput=items / stats["seconds"] if stats["seconds"] else None,
+        max_rss_mb=rss,
+        rss_growth_mb=rss - floor if rss is not None else None,
+    )
+    return stats
+
+
+def run_in_child(*args: str) -> str:
+    """Run ``benchmarks.run`` with ``args`` in a fresh process; returns stdout.
+
+    Generating the ledger and every case run in children: max RSS is a
+    high-water mark that can't be reset between cases, and Linux carries
+    the parent's into a child's ru_maxrss across exec, so the parent has to
+    stay small too.
+    """
+    child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", *args],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if child.returncode:
+        raise RuntimeError(f"{' '.join(args[:2])} failed:\n{child.stderr}")
+    return child.stdout
+
+
+def run_suite(sizes: List[int], repeat: int, only: List[str]) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            path = os.path.join(workdir, f"ledger_{rows}.db")
+            start = time.perf_counter()
+            prepare = ["prepare", "--rows", str(rows), "--db", path, "--workdir", workdir]
+            if not only or {"import_csv", "import_csv_duplicates"} & set(only):
+                prepare.append("--inputs")
+            run_in_child(*prepare)
+            print(f"\n{rows:,} rows (generated in {time.perf_counter() - start:.1f}s)")
+            for name in bench_cases(rows, workdir, only=[]):
+                if only and name not in only:
+                    continue
+                output = run_in_child(
+                    "case", name, "--rows", str(rows), "--db", path,
+                    "--workdir", workdir, "--repeat", str(repeat),
+                )
+                stats = json.loads(output.splitlines()[-1])
+                results.append(stats)
+                rss = ""
+                if stats["max_rss_mb"] is not None:
+                    rss = f"  max RSS {stats['max_rss_mb']:7.1f} MB (+{stats['rss_growth_mb']:.1f})"
+                print(
+                    f"  {name:<24} {stats['seconds'] * 1000:10.2f} ms"
+                    f"  {stats['throughput'] or 0:14,.0f} items/s"
+                    f"  peak {stats['peak_mb']:8.1f} MB{rss}"
+                )
+    return {"meta": run_metadata(repeat), "results": results}
+
+
+def run_metadata(repeat: int) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+    }
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """Print per-case ratios; return the number of regressions."""
+    with open(baseline_path) as fh:
+        baseline = {(r["name"], r["rows"]): r for r in json.load(fh)["results"]}
+    with open(current_path) as fh:
+        current = json.load(fh)["results"]
+
+    regressions = 0
+    for result in current:
+        old = baseline.get((result["name"], result["rows"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "faster"
+        # Files from before max RSS was recorded have no such field
+        rss = ""
+        if old.get("max_rss_mb") is not None and result.get("max_rss_mb") is not None:
+            rss = f"  RSS {old['max_rss_mb']:7.1f} -> {result['max_rss_mb']:7.1f} MB"
+            grown = result["max_rss_mb"] - old["max_rss_mb"]
+            if grown > max(RSS_MIN_REGRESSION_MB, threshold * old["max_rss_mb"]):
+                flag = " ".join(filter(None, [flag, "MEMORY REGRESSION"]))
+                regressions += 1
+        print(
+            f"{result['name']:<24} {result['rows']:>12,}"
+            f"  {old['seconds'] * 1000:10.2f} -> {result['seconds'] * 1000:10.2f} ms"
+            f"  x{ratio:5.2f}{rss}  {flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command")
+
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    # Used by run_suite: generate a ledger (and the import cases' files)
+    prepare_parser = sub.add_parser("prepare", help="generate a ledger (internal)")
+    prepare_parser.add_argument("--rows", type=int, required=True)
+    prepare_parser.add_argument("--db", required=True)
+    prepare_parser.add_argument("--workdir", required=True)
+    prepare_parser.add_argument("--inputs", action="store_true")
+
+    # Used by run_suite: one case in this process, stats as JSON on stdout
+    case_parser = sub.add_parser("case", help="run a single case (internal)")
+    case_parser.add_argument("name")
+    case_parser.add_argument("--rows", type=int, required=True)
+    case_parser.add_argument("--db", required=True)
+    case_parser.add_argument("--workdir", required=True)
+    case_parser.add_argument("--repeat", type=int, default=3)
+
+    parser.add_argument("--sizes", default="10k", help="comma separated, e.g. 10k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="comma separated case names")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressions = compare(args.baseline, args.current, args.threshold)
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}.")
+        sys.exit(1 if regressions else 0)
+    if args.command == "prepare":
+        fill_database(args.db, args.rows)
+        if args.inputs:
+            write_inputs(args.rows, args.workdir)
+        return
+    if args.command == "case":
+        print(json.dumps(run_case(args.name, args.rows, args.db, args.workdir, args.repeat)))
+        return
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    report = run_suite(sizes, args.repeat, only)
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nSaved results to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
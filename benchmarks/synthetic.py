@@ -0,0 +1,129 @@
+"""Deterministic synthetic ledgers for benchmarks.
+
+The same ``rows`` and ``seed`` always produce the same expenses, budgets and
+bank-statement descriptions, so timings from different runs are comparable.
+
+    python -m benchmarks.synthetic --rows 1000000 --db /tmp/ledger.db
+"""
+import argparse
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+import db
+from money import to_cents, to_cents_array
+
+DEFAULT_SEED = 20240101
+INSERT_CHUNK = 200_000
+START_DATE = np.datetime64("2015-01-01")
+YEARS = 10
+
+# (category, share of transactions, median amount, merchants on statements)
+CATEGORY_PROFILES = [
+    ("Groceries", 0.22, 45.0, ["WALMART SUPERCENTER", "FRESH GROCERY", "SUPERMARKET 24"]),
+    ("Coffee", 0.14, 5.5, ["STARBUCKS", "JOE'S COFFEE", "BLUE BOTTLE COFFEE"]),
+    ("Transport", 0.14, 18.0, ["UBER *TRIP", "LYFT RIDE", "CITY TAXI"]),
+    ("Dining", 0.12, 32.0, ["CHIPOTLE", "PIZZA PALACE", "SUSHI BAR"]),
+    ("Shopping", 0.10, 60.0, ["AMAZON MKTPLACE", "TARGET", "BEST BUY"]),
+    ("Subscriptions", 0.08, 12.0, ["NETFLIX.COM", "SPOTIFY USA", "SUBSCRIPTION BOX"]),
+    ("Fitness", 0.05, 40.0, ["GOLD'S GYM", "FITNESS FIRST", "YOGA STUDIO"]),
+    ("Utilities", 0.06, 90.0, ["CITY POWER", "WATER DEPT", "COMCAST"]),
+    ("Health", 0.05, 35.0, ["CVS PHARMACY", "WALGREENS", "DENTAL CARE"]),
+    ("Rent", 0.04, 1500.0, ["MONTHLY RENT", "RENT PAYMENT", "PROPERTY MGMT"]),
+]
+SOURCES = ["manual", "import"]
+SOURCE_WEIGHTS = [0.15, 0.85]
+
+
+def generate_chunks(
+    rows: int, seed: int = DEFAULT_SEED, chunk: int = INSERT_CHUNK
+) -> Iterator[pd.DataFrame]:
+    """Yield frames with Date, Category, Amount, Source and Description."""
+    rng = np.random.default_rng(seed)
+    names = [p[0] for p in CATEGORY_PROFILES]
+    shares = np.array([p[1] for p in CATEGORY_PROFILES])
+    shares = shares / shares.sum()
+    medians = np.array([p[2] for p in CATEGORY_PROFILES])
+    merchants = [p[3] for p in CATEGORY_PROFILES]
+    days = YEARS * 365
+
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        cat_idx = rng.choice(len(names), size=n, p=shares)
+        # Dates are spread evenly over the period, sorted within a chunk
+        day_offsets = np.sort(rng.integers(0, days, n))
+        amounts = np.round(medians[cat_idx] * rng.lognormal(0.0, 0.5, n), 2)
+        merchant_idx = rng.integers(0, 3, n)
+        store_numbers = rng.integers(1, 500, n)
+        yield pd.DataFrame(
+            {
+                "Date": (START_DATE + day_offsets).astype("datetime64[D]").astype(str),
+                "Category": np.array(names, dtype=object)[cat_idx],
+                "Amount": amounts,
+                "Source": rng.choice(SOURCES, size=n, p=SOURCE_WEIGHTS),
+                "Description": [
+                    f"{merchants[c][m]} #{s}"
+                    for c, m, s in zip(cat_idx, merchant_idx, store_numbers)
+                ],
+            }
+        )
+
+
+def fill_database(path: str, rows: int, seed: int = DEFAULT_SEED):
+    """Create ``path`` and fill expenses and budgets with ``rows`` expenses."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; pick a new path")
+    db.DB_FILE = path
+    db.init_db()
+    with db.transaction() as conn:
+        for frame in generate_chunks(rows, seed):
+            conn.executemany(
+                "INSERT INTO expenses (date, category, amount_cents, source) VALUES (?, ?, ?, ?);",
+                zip(
+                    frame["Date"],
+                    frame["Category"],
+                    to_cents_array(frame["Amount"]).tolist(),
+                    frame["Source"],
+                ),
+            )
+        # Budgets roughly match each category's expected monthly spend
+        monthly_rows = rows / (YEARS * 12)
+        conn.executemany(
+            "INSERT INTO budgets (category, monthly_budget_cents) VALUES (?, ?);",
+            [
+                (name, to_cents(round(median * share * monthly_rows, 2)))
+                for name, share, median, _ in CATEGORY_PROFILES
+            ],
+        )
+        db.bump_data_version(conn)
+
+
+def write_statement_csv(path: str, rows: int, seed: int = DEFAULT_SEED):
+    """Write a bank-statement style CSV (Date, Description, Amount)."""
+    header = True
+    for frame in generate_chunks(rows, seed):
+        frame[["Date", "Description", "Amount"]].to_csv(
+            path, mode="w" if header else "a", header=header, index=False
+        )
+        header = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--db", default="synthetic_expenses.db")
+    parser.add_argument("--csv", help="also write a statement CSV to this path")
+    args = parser.parse_args()
+
+    fill_database(args.db, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} expenses to {args.db}.")
+    if args.csv:
+        write_statement_csv(args.csv, args.rows, args.seed)
+        print(f"Wrote {args.rows:,} statement rows to {args.csv}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+MAX_ENTRIES = 256
+
+
+class VersionedCache:
+    """Memoizes read helpers until the database change version moves.
+
+    ``version_fn`` returns a cheap token identifying the current state of the
+    data (the database path plus its write counter). Every entry is dropped
+    as soon as the token changes, so a write invalidates exactly once and
+    rereading unchanged data is a dictionary lookup.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, version_fn: Callable[[], Hashable], max_entries: int = MAX_ENTRIES):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self._version = None
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries.clear()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        version = self.version_fn()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = compute()
+        with self._lock:
+            # A write may have landed while computing; the value is at least
+            # as new as ``version``, so it's only stored under that version.
+            if version == self._version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def memoize(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+            return self.get_or_compute(key, lambda: fn(*args, **kwargs))
+
+        wrapper.uncached = fn
+        return wrapper
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import functools
+import re
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+UNCATEGORIZED = "Uncategorized"
+MEMO_SIZE = 65_536
+
+# (pattern, category, priority). Patterns are case-insensitive substrings and
+# the highest priority match wins, which keeps the order of the original
+# if-chain for the built-in rules.
+DEFAULT_RULES: List[Tuple[str, str, int]] = [
+    ("UBER", "Transport", 60),
+    ("LYFT", "Transport", 60),
+    ("TAXI", "Transport", 60),
+    ("STARBUCKS", "Coffee", 50),
+    ("COFFEE", "Coffee", 50),
+    ("WALMART", "Groceries", 40),
+    ("GROCERY", "Groceries", 40),
+    ("SUPERMARKET", "Groceries", 40),
+    ("RENT", "Rent", 30),
+    ("NETFLIX", "Subscriptions", 20),
+    ("SPOTIFY", "Subscriptions", 20),
+    ("SUBSCRIPTION", "Subscriptions", 20),
+    ("GYM", "Fitness", 10),
+    ("FITNESS", "Fitness", 10),
+]
+
+
+class CategoryMatcher:
+    """All category rules compiled into a single regex.
+
+    The alternation sits inside a lookahead so the scan reports the best
+    rule starting at every position, including overlapping ones; the result
+    is the highest priority rule matching anywhere in the description.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str, int]], memo_size: int = MEMO_SIZE):
+        best = {}
+        for pattern, category, priority in rules:
+            key = pattern.upper()
+            if key and (key not in best or priority > best[key][1]):
+                best[key] = (category, priority)
+
+        # Alternatives are tried in order; the stable sort keeps definition
+        # order among rules of equal priority.
+        ordered = sorted(best.items(), key=lambda item: -item[1][1])
+        self._rank = {pattern: rank for rank, (pattern, _) in enumerate(ordered)}
+        self._categories = [category for _, (category, _) in ordered]
+        self._regex = (
+            re.compile("(?=(" + "|".join(re.escape(p) for p, _ in ordered) + "))")
+            if ordered
+            else None
+        )
+        self.classify = functools.lru_cache(maxsize=memo_size)(self._classify)
+
+    def _classify(self, description: Optional[str]) -> str:
+        if not isinstance(description, str) or self._regex is None:
+            return UNCATEGORIZED
+        matches = self._regex.findall(description.upper())
+        if not matches:
+            return UNCATEGORIZED
+        return self._categories[min(self._rank[m] for m in matches)]
+
+    def classify_column(self, descriptions: pd.Series) -> pd.Series:
+        import numpy as np
+        import pandas as pd
+
+        # Classify each distinct description once and broadcast the result
+        # back through the factorized codes.
+        codes, uniques = pd.factorize(descriptions)
+        labels = np.array(
+            [self.classify(value) for value in uniques] + [UNCATEGORIZED],
+            dtype=object,
+        )
+        # Missing values get code -1, which picks the trailing UNCATEGORIZED.
+        return pd.Series(labels[codes], index=descriptions.index)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable
+
+from instrumentation import span
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.figure import Figure
+
+# Charts are drawn on standalone Figures (never registered with pyplot, so
+# nothing accumulates between reruns), rendered to PNG and memoized on a hash
+# of the data they were drawn from.
+MAX_CACHED_CHARTS = 64
+# Line charts with more points than this are bucketed before drawing.
+MAX_LINE_POINTS = 400
+DPI = 100
+
+_png_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+# The Agg backend isn't guaranteed thread-safe across concurrent sessions.
+_render_lock = threading.Lock()
+
+
+def _fingerprint(value, digest) -> None:
+    import pandas as pd
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(list(labels)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def chart_key(name: str, *args, **kwargs) -> str:
+    digest = hashlib.blake2b(name.encode(), digest_size=16)
+    for value in args:
+        _fingerprint(value, digest)
+    for key in sorted(kwargs):
+        digest.update(key.encode())
+        _fingerprint(kwargs[key], digest)
+    return digest.hexdigest()
+
+
+def render_png(draw: Callable[[Figure], None]) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    with _render_lock:
+        fig = Figure(dpi=DPI)
+        FigureCanvasAgg(fig)
+        draw(fig)
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        # Break the figure's reference cycles right away.
+        fig.clear()
+    return buf.getvalue()
+
+
+def cached_chart(draw_fn: Callable) -> Callable:
+    """Turn ``draw_fn(fig, *data)`` into ``fn(*data) -> PNG bytes``, memoized."""
+
+    @functools.wraps(draw_fn)
+    def wrapper(*args, **kwargs) -> bytes:
+        key = chart_key(draw_fn.__qualname__, *args, **kwargs)
+        with _cache_lock:
+            png = _png_cache.get(key)
+            if png is not None:
+                _png_cache.move_to_end(key)
+                return png
+        with span("chart", draw_fn.__name__):
+            png = render_png(lambda fig: draw_fn(fig, *args, **kwargs))
+        with _cache_lock:
+            _png_cache[key] = png
+            while len(_png_cache) > MAX_CACHED_CHARTS:
+                _png_cache.popitem(last=False)
+        return png
+
+    return wrapper
+
+
+def bucket_series(df: pd.DataFrame, x: str, max_points: int = MAX_LINE_POINTS) -> pd.DataFrame:
+    """Average consecutive rows into at most ``max_points`` buckets.
+
+    Each bucket is plotted at its first x value, so a 20-year daily series
+    draws in the same time as a one-year one.
+    """
+    import numpy as np
+
+    if len(df) <= max_points:
+        return df
+    buckets = np.arange(len(df)) * max_points // len(df)
+    grouped = df.groupby(buckets)
+    out = grouped.mean(numeric_only=True)
+    out[x] = grouped[x].first()
+    return out.reset_index(drop=True)
+
+
+def _rotate_xticks(ax):
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment("right")
+
+
+# ---------- Page charts ----------
+
+@cached_chart
+def monthly_rolling_chart(fig: Figure, monthly_df: pd.DataFrame):
+    data = bucket_series(monthly_df, "Month")
+    ax = fig.subplots()
+    ax.plot(data["Month"], data["Amount"], marker="o", label="Monthly Total")
+    ax.plot(
+        data["Month"],
+        data["Rolling_3M"],
+        marker="o",
+        linestyle="--",
+        label="3-Month Rolling Avg",
+    )
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Amount")
+    ax.set_title("Monthly Expenses & Rolling Average")
+    ax.legend()
+    _rotate_xticks(ax)
+
+
+@cached_chart
+def variance_bar_chart(fig: Figure, variance_df: pd.DataFrame):
+    ax = fig.subplots()
+    ax.bar(variance_df["Category"], variance_df["Variance"])
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Variance (Actual - Budget)")
+    ax.set_title("Budget Variance by Category")
+    _rotate_xticks(ax)
+
+
+@cached_chart
+def category_pie_chart(fig: Figure, totals_by_category: pd.Series):
+    ax = fig.subplots()
+    ax.pie(
+        totals_by_category,
+        labels=totals_by_category.index,
+        autopct="%1.1f%%",
+        startangle=140,
+    )
+    ax.axis("equal")
+
+
+@cached_chart
+def monthly_bar_chart(fig: Figure, monthly_df: pd.DataFrame):
+    ax = fig.subplots()
+    ax.bar(monthly_df["Month"], monthly_df["Amount"])
+    ax.set_title("Monthly Expenses")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Total Expenses")
+    _rotate_xticks(ax)
+
+
+@cached_chart
+def daily_line_chart(fig: Figure, daily_df: pd.DataFrame):
+    data = bucket_series(daily_df, "Date")
+    ax = fig.subplots()
+    ax.plot(data["Date"], data["Amount"])
+    ax.set_title(
+        "Daily Expenses" if len(data) == len(daily_df) else "Daily Expenses (bucket averages)"
+    )
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Amount")
+    _rotate_xticks(ax)
+
+
+@cached_chart
+def forecast_chart(fig: Figure, history: pd.DataFrame, forecast: pd.DataFrame, series: str):
+    history = bucket_series(history[["Month_Index", series]], "Month_Index")
+    ax = fig.subplots()
+    ax.plot(history["Month_Index"], history[series], marker="o", label="Historical")
+    ax.plot(
+        forecast["Month_Index"],
+        forecast[series],
+        marker="o",
+        linestyle="--",
+        label="Forecast",
+    )
+    ax.set_title("Expense Forecast")
+    ax.set_xlabel("Month Index")
+    ax.set_ylabel("Total Expenses")
+    ax.legend()
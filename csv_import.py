@@ -0,0 +1,203 @@
+import hashlib
+import sqlite3
+import warnings
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from categorize import UNCATEGORIZED
+from money import to_cents_array
+
+# Rows parsed and inserted per executemany batch; bounds memory for large uploads.
+DEFAULT_CHUNKSIZE = 50_000
+# Only the first rejects are kept for display, the rest are just counted.
+MAX_REJECT_SAMPLES = 200
+# Page cache of an OccurrenceCounter's scratch database, in KiB
+COUNTER_CACHE_KIB = 8192
+
+# Rows whose fingerprint is already in the ledger are dropped by the unique
+# index in the same statement, so re-importing an overlapping export is safe.
+INSERT_EXPENSE_SQL = (
+    "INSERT INTO expenses (date, category, amount_cents, source, fingerprint) "
+    "VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING;"
+)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    # Fast path parses the whole column with one inferred format; rows that
+    # don't match it are retried one by one so mixed formats still import.
+    with warnings.catch_warnings():
+        # pandas warns when it can't infer a single format; that case is
+        # exactly what the per-row retry below handles.
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(values, errors="coerce")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed = parsed.astype(object)
+        parsed[retry] = [pd.to_datetime(v, errors="coerce") for v in values[retry]]
+        parsed = pd.to_datetime(parsed, errors="coerce")
+    return parsed
+
+
+# ---------- Fingerprints ----------
+
+def normalize_descriptions(values: pd.Series) -> pd.Series:
+    # Case and spacing differ between exports of the same statement
+    return values.fillna("").astype(str).str.upper().str.split().str.join(" ")
+
+
+class OccurrenceCounter:
+    """Numbers repeats of the same key 0, 1, 2, ... across the chunks of a file.
+
+    Two identical transactions on one day (two coffees) are both real, so
+    the occurrence number is part of the fingerprint; an overlapping export
+    lists them again in the same order and they map to the same rows.
+
+    Counts seen so far live in a private on-disk SQLite database (deleted
+    on close) rather than in memory, clustered by day: a statement runs in
+    date order, so each chunk's lookups and upserts touch the few pages of
+    its own dates and cost the same however many rows came before. Files
+    in any other order are numbered just the same, only with more reads.
+    """
+
+    def __init__(self):
+        # "" opens a temporary database backed by a file, not by memory
+        self._conn = sqlite3.connect("")
+        for pragma in (
+            "PRAGMA journal_mode=OFF;",
+            "PRAGMA synchronous=OFF;",
+            f"PRAGMA cache_size=-{COUNTER_CACHE_KIB};",
+        ):
+            self._conn.execute(pragma)
+        self._conn.execute(
+            "CREATE TABLE seen (day INTEGER, key INTEGER, n INTEGER NOT NULL, "
+            "PRIMARY KEY (day, key)) WITHOUT ROWID;"
+        )
+        self._conn.execute(
+            "CREATE TABLE chunk (pos INTEGER PRIMARY KEY, day INTEGER, key INTEGER, n INTEGER);"
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def number(self, days: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """Occurrence numbers for rows with these day ordinals and uint64 keys."""
+        uniq, first, inverse, counts = np.unique(
+            keys, return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        # SQLite integers are signed, hence the int64 view of the keys. Rows
+        # go in (day, key) order so the join and upsert below walk ``seen``
+        # front to back.
+        uniq_days, uniq_keys = days[first], uniq.view(np.int64)
+        order = np.lexsort((uniq_keys, uniq_days))
+        seen = np.empty(len(uniq), dtype=np.int64)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO chunk (day, key, n) VALUES (?, ?, ?);",
+                zip(uniq_days[order].tolist(), uniq_keys[order].tolist(), counts[order].tolist()),
+            )
+            cursor = self._conn.execute(
+                "SELECT coalesce(seen.n, 0) FROM chunk "
+                "LEFT JOIN seen USING (day, key) ORDER BY chunk.pos;"
+            )
+            seen[order] = np.fromiter((row[0] for row in cursor), dtype=np.int64, count=len(uniq))
+            self._conn.execute(
+                "INSERT INTO seen (day, key, n) SELECT day, key, n FROM chunk WHERE true "
+                "ON CONFLICT (day, key) DO UPDATE SET n = n + excluded.n;"
+            )
+            self._conn.execute("DELETE FROM chunk;")
+
+        # Rank of each row among the chunk's rows with the same key
+        order = np.argsort(inverse, kind="stable")
+        ranks = np.empty(len(keys), dtype=np.int64)
+        ranks[order] = np.arange(len(keys)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return seen[inverse] + ranks
+
+
+def fingerprints(
+    dates: pd.Series,
+    cents: pd.Series,
+    descriptions: pd.Series,
+    source: str,
+    occurrences: OccurrenceCounter,
+) -> List[bytes]:
+    """Stable 16-byte fingerprint per row: date, cents, description, source, occurrence."""
+    keys = pd.util.hash_pandas_object(
+        pd.DataFrame({"d": dates, "c": cents, "t": descriptions}), index=False
+    ).to_numpy()
+    days = pd.to_datetime(dates, format="%Y-%m-%d").to_numpy().astype("datetime64[D]").view(np.int64)
+    numbers = occurrences.number(days, keys)
+    return [
+        hashlib.blake2b(f"{d}|{c}|{t}|{source}|{n}".encode(), digest_size=16).digest()
+        for d, c, t, n in zip(dates, cents, descriptions, numbers)
+    ]
+
+
+def prepare_chunk(
+    df: pd.DataFrame,
+    date_col: str,
+    amount_col: str,
+    desc_col: Optional[str],
+    categorize: Optional[Callable[[pd.Series], pd.Series]],
+    first_row: int = 1,
+    source: str = "import",
+    occurrences: Optional[OccurrenceCounter] = None,
+) -> Tuple[List[tuple], List[Tuple[int, str]], int]:
+    """Turn a raw CSV chunk into insert records, rejects and a zero-amount count.
+
+    Pass the same ``occurrences`` for every chunk of a file so repeated rows
+    are numbered across chunk boundaries. Without ``categorize`` every row
+    is Uncategorized.
+    """
+    row_numbers = pd.RangeIndex(first_row, first_row + len(df))
+    dates = parse_dates(df[date_col]).set_axis(row_numbers)
+    amounts = pd.to_numeric(df[amount_col], errors="coerce").set_axis(row_numbers)
+
+    bad_date = dates.isna()
+    bad_amount = amounts.isna()
+    rejects = [
+        (row, "invalid date" if date_bad else "invalid amount")
+        for row, date_bad in zip(
+            row_numbers[bad_date | bad_amount], bad_date[bad_date | bad_amount]
+        )
+    ]
+
+    valid = ~(bad_date | bad_amount)
+    zero = valid & (amounts == 0)
+    keep = valid & ~zero
+
+    descriptions = df[desc_col].set_axis(row_numbers)[keep] if desc_col else None
+    if descriptions is not None and categorize is not None:
+        categories = categorize(descriptions)
+    else:
+        categories = pd.Series(UNCATEGORIZED, index=row_numbers[keep])
+
+    date_strings = dates[keep].dt.strftime("%Y-%m-%d")
+    cents = pd.Series(to_cents_array(amounts[keep]), index=row_numbers[keep])
+    fingerprint_list = fingerprints(
+        date_strings,
+        cents,
+        normalize_descriptions(
+            descriptions if descriptions is not None else pd.Series("", index=row_numbers[keep])
+        ),
+        source,
+        occurrences if occurrences is not None else OccurrenceCounter(),
+    )
+    records = list(
+        zip(
+            date_strings,
+            categories,
+            cents.tolist(),
+            [source] * int(keep.sum()),
+            fingerprint_list,
+        )
+    )
+    return records, rejects, int(zero.sum())
+
+
+def iter_csv_chunks(source, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    # Everything is read as text; dates and amounts are parsed per column later.
+    return pd.read_csv(source, chunksize=chunksize, dtype=str)
+
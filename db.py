@@ -0,0 +1,626 @@
+from __future__ import annotations
+
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, date
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from cache import VersionedCache
+from instrumentation import connection_factory, timed
+from categorize import DEFAULT_RULES, CategoryMatcher
+from money import from_cents, to_cents
+from writer import submit_write, write
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DB_FILE = "expenses.db"
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer and cache_size < 0 is in KiB. NORMAL sync keeps a WAL database
+# consistent but can lose the last commits on power failure; the write queue
+# (writer.py) commits with FULL before it acknowledges a write.
+CONNECTION_SYNCHRONOUS = "NORMAL"
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    f"PRAGMA synchronous={CONNECTION_SYNCHRONOUS};",
+    "PRAGMA cache_size=-65536;",
+    "PRAGMA temp_store=MEMORY;",
+)
+BUSY_TIMEOUT_SECONDS = 10.0
+MAX_IDLE_CONNECTIONS = 8
+
+
+# ---------- Connection management ----------
+
+def _configure(conn: sqlite3.Connection) -> sqlite3.Connection:
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@timed("db")
+def open_connection(path: str, **kwargs) -> sqlite3.Connection:
+    return _configure(
+        sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            factory=connection_factory(),
+            **kwargs,
+        )
+    )
+
+
+@timed("db")
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    # Standalone connection owned by the caller, who must close it.
+    return open_connection(path or DB_FILE)
+
+
+class ConnectionPool:
+    """Reusable connections for one database file.
+
+    Idle connections are handed out LIFO so back-to-back helper calls in a
+    Streamlit rerun keep hitting the same warm connection and page cache.
+    A connection checked out by a thread is reused by nested calls in that
+    thread until the outermost ``connection()`` block exits.
+    """
+
+    def __init__(self, path: str, max_idle: int = MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        # Connections move between threads through the pool but are never
+        # used by two threads at once.
+        return open_connection(self.path, check_same_thread=False)
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Nested block joins the enclosing transaction.
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def holds_transaction(self) -> bool:
+        """Whether the calling thread is inside a transaction on this pool."""
+        conn = getattr(self._local, "conn", None)
+        return conn is not None and conn.in_transaction
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Optional[str] = None) -> ConnectionPool:
+    path = path or DB_FILE
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+def connection(path: Optional[str] = None):
+    return get_pool(path).connection()
+
+
+def transaction(path: Optional[str] = None):
+    return get_pool(path).transaction()
+
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+# ---------- Schema and helpers ----------
+
+def create_schema(conn: sqlite3.Connection):
+    # Expenses table
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            source TEXT,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        """
+    )
+
+    # Budgets table
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS budgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL UNIQUE,
+            monthly_budget REAL NOT NULL
+        );
+        """
+    )
+
+    # Indexes backing the date-range and per-category aggregations
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_category_date "
+        "ON expenses (category, date);"
+    )
+
+    # Write counter keying the snapshot cache; bumped by every write helper
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO change_counter (id, version) VALUES (1, 0);")
+
+    # Auto-categorization rules, seeded with the built-in defaults
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pattern TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            category TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    if conn.execute("SELECT COUNT(*) FROM category_rules;").fetchone()[0] == 0:
+        conn.executemany(
+            "INSERT INTO category_rules (pattern, category, priority) VALUES (?, ?, ?);",
+            DEFAULT_RULES,
+        )
+
+
+def add_amount_index(conn: sqlite3.Connection):
+    # Lets the expense browser page through amount-sorted results by keyset
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses (amount);")
+
+
+def create_import_jobs(conn: sqlite3.Connection):
+    # Background CSV imports (see import_jobs). Progress and counts are
+    # updated in the same transaction as each chunk of inserted rows.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT NOT NULL,
+            staged_path TEXT NOT NULL,
+            date_col TEXT NOT NULL,
+            amount_col TEXT NOT NULL,
+            desc_col TEXT,
+            chunksize INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total_rows INTEGER,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            skipped_zero INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            heartbeat REAL,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_job_rejects (
+            job_id INTEGER NOT NULL REFERENCES import_jobs (id),
+            row INTEGER NOT NULL,
+            reason TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_import_job_rejects_job "
+        "ON import_job_rejects (job_id, row);"
+    )
+
+
+def add_expense_fingerprints(conn: sqlite3.Connection):
+    # Imported rows carry a fingerprint (see csv_import.fingerprints); the
+    # unique index makes re-imported rows no-ops. Manual entries and rows
+    # imported before this migration have none and are never deduplicated.
+    conn.execute("ALTER TABLE expenses ADD COLUMN fingerprint BLOB;")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_fingerprint "
+        "ON expenses (fingerprint) WHERE fingerprint IS NOT NULL;"
+    )
+    conn.execute(
+        "ALTER TABLE import_jobs ADD COLUMN source TEXT NOT NULL DEFAULT 'import';"
+    )
+    conn.execute(
+        "ALTER TABLE import_jobs ADD COLUMN duplicates INTEGER NOT NULL DEFAULT 0;"
+    )
+
+
+def store_amounts_as_cents(conn: sqlite3.Connection):
+    # Money becomes INTEGER cents so sums are exact. SQLite can't change a
+    # column's type in place, so expenses and budgets are rebuilt (dropping
+    # the old triggers and indexes with them) and the rollup is recreated.
+    # Old amounts are converted by to_cents itself, so they round exactly as
+    # new ones entered through the app or a CSV import do.
+    conn.create_function("to_cents", 1, to_cents, deterministic=True)
+    seq = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'expenses';"
+    ).fetchone()
+    conn.execute("DROP TABLE IF EXISTS monthly_rollup;")
+    conn.execute(
+        """
+        CREATE TABLE expenses_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            source TEXT,
+            created_at TEXT DEFAULT (datetime('now')),
+            fingerprint BLOB
+        );
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO expenses_new (id, date, category, amount_cents, source, created_at, fingerprint)
+        SELECT id, date, category, to_cents(amount), source,
+               created_at, fingerprint
+        FROM expenses;
+        """
+    )
+    conn.execute("DROP TABLE expenses;")
+    conn.execute("ALTER TABLE expenses_new RENAME TO expenses;")
+    if seq is not None:
+        # Keep ids of deleted rows from being handed out again
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses';", (seq[0],)
+        )
+    conn.execute("CREATE INDEX idx_expenses_date ON expenses (date);")
+    conn.execute("CREATE INDEX idx_expenses_category_date ON expenses (category, date);")
+    conn.execute("CREATE INDEX idx_expenses_amount_cents ON expenses (amount_cents);")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_expenses_fingerprint "
+        "ON expenses (fingerprint) WHERE fingerprint IS NOT NULL;"
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE budgets_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL UNIQUE,
+            monthly_budget_cents INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO budgets_new (id, category, monthly_budget_cents)
+        SELECT id, category, to_cents(monthly_budget) FROM budgets;
+        """
+    )
+    conn.execute("DROP TABLE budgets;")
+    conn.execute("ALTER TABLE budgets_new RENAME TO budgets;")
+
+    init_monthly_rollup(conn)
+
+
+def add_category_amount_index(conn: sqlite3.Connection):
+    # Amount-sorted browsing within a category seeks instead of sorting
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_category_amount_cents "
+        "ON expenses (category, amount_cents);"
+    )
+
+
+# Ordered schema steps. PRAGMA user_version records how many have been applied,
+# so the DDL runs once per database, and init_db only checks once per process.
+MIGRATIONS = [
+    create_schema,
+    add_amount_index,
+    create_import_jobs,
+    add_expense_fingerprints,
+    store_amounts_as_cents,
+    add_category_amount_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def schema_version() -> int:
+    with connection() as conn:
+        return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+@timed("db")
+def init_db():
+    path = DB_FILE
+    if path in _initialized_paths:
+        return
+    with _init_lock:
+        if path in _initialized_paths:
+            return
+        if schema_version() < SCHEMA_VERSION:
+            with transaction() as conn:
+                # Re-read under the write lock in case another process migrated
+                current = conn.execute("PRAGMA user_version;").fetchone()[0]
+                for migrate in MIGRATIONS[current:]:
+                    migrate(conn)
+                conn.execute(f"PRAGMA user_version = {max(current, SCHEMA_VERSION)};")
+        _initialized_paths.add(path)
+
+
+# ---------- Monthly rollup ----------
+
+# Month key used by the rollup and every month-level query. Dates are stored
+# as YYYY-MM-DD; anything strftime can't parse falls back to its prefix.
+MONTH_KEY_SQL = "COALESCE(strftime('%Y-%m', {col}), substr({col}, 1, 7))"
+
+ROLLUP_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert
+    AFTER INSERT ON expenses
+    BEGIN
+        INSERT INTO monthly_rollup (month, category, total_cents, count)
+        VALUES ({MONTH_KEY_SQL.format(col="NEW.date")}, NEW.category, NEW.amount_cents, 1)
+        ON CONFLICT (month, category) DO UPDATE
+        SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete
+    AFTER DELETE ON expenses
+    BEGIN
+        UPDATE monthly_rollup
+        SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+        WHERE month = {MONTH_KEY_SQL.format(col="OLD.date")} AND category = OLD.category;
+        DELETE FROM monthly_rollup WHERE count <= 0;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+    AFTER UPDATE OF date, category, amount_cents ON expenses
+    BEGIN
+        UPDATE monthly_rollup
+        SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+        WHERE month = {MONTH_KEY_SQL.format(col="OLD.date")} AND category = OLD.category;
+        DELETE FROM monthly_rollup WHERE count <= 0;
+        INSERT INTO monthly_rollup (month, category, total_cents, count)
+        VALUES ({MONTH_KEY_SQL.format(col="NEW.date")}, NEW.category, NEW.amount_cents, 1)
+        ON CONFLICT (month, category) DO UPDATE
+        SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+    END;
+    """,
+)
+
+
+def init_monthly_rollup(conn: sqlite3.Connection):
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_rollup';"
+    ).fetchone() is None
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS monthly_rollup (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_cents INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, category)
+        ) WITHOUT ROWID;
+        """
+    )
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(trigger)
+    if created:
+        # Existing databases get their history rolled up once
+        rebuild_monthly_rollup(conn)
+
+
+@timed("db")
+def rebuild_monthly_rollup(conn: Optional[sqlite3.Connection] = None):
+    if conn is None:
+        with transaction() as conn:
+            return rebuild_monthly_rollup(conn)
+    conn.execute("DELETE FROM monthly_rollup;")
+    conn.execute(
+        f"""
+        INSERT INTO monthly_rollup (month, category, total_cents, count)
+        SELECT {MONTH_KEY_SQL.format(col="date")}, category, SUM(amount_cents), COUNT(*)
+        FROM expenses
+        GROUP BY 1, 2;
+        """
+    )
+    bump_data_version(conn)
+
+
+@timed("db")
+def data_version() -> tuple:
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM change_counter WHERE id = 1;").fetchone()
+    return (DB_FILE, row[0])
+
+
+def bump_data_version(conn: sqlite3.Connection):
+    # Call inside the writing transaction so readers never see new rows
+    # under an old version.
+    conn.execute("UPDATE change_counter SET version = version + 1 WHERE id = 1;")
+
+
+snapshot_cache = VersionedCache(data_version)
+
+
+@timed("db")
+@snapshot_cache.memoize
+def load_budgets() -> dict:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT category, monthly_budget_cents FROM budgets ORDER BY category;"
+        ).fetchall()
+    return {row["category"]: from_cents(row["monthly_budget_cents"]) for row in rows}
+
+
+# Small writes go through the group-commit writer (see writer.py): callers
+# in any thread return once their row is committed, and concurrent writes
+# share one transaction. The submit_* variants return the Future instead.
+
+def submit_budget(category: str, amount: float) -> Future:
+    params = (category, to_cents(amount))
+    return submit_write(
+        lambda conn: conn.execute(
+            """
+            INSERT INTO budgets (category, monthly_budget_cents)
+            VALUES (?, ?)
+            ON CONFLICT(category) DO UPDATE
+            SET monthly_budget_cents = excluded.monthly_budget_cents;
+            """,
+            params,
+        ).rowcount
+    )
+
+
+@timed("db")
+def set_budget(category: str, amount: float):
+    submit_budget(category, amount).result()
+
+
+def submit_expense(date_value, category: str, amount: float, source: str = "manual") -> Future:
+    """Queue an expense; the Future resolves to its row id once committed."""
+    if isinstance(date_value, (datetime, date)):
+        date_str = date_value.strftime("%Y-%m-%d")
+    else:
+        date_str = str(date_value)
+    params = (date_str, category, to_cents(amount), source)
+    return submit_write(
+        lambda conn: conn.execute(
+            "INSERT INTO expenses (date, category, amount_cents, source) VALUES (?, ?, ?, ?);",
+            params,
+        ).lastrowid
+    )
+
+
+@timed("db")
+def add_expense(date_value, category: str, amount: float, source: str = "manual") -> int:
+    return submit_expense(date_value, category, amount, source).result()
+
+
+# ---------- Category rules ----------
+
+@timed("db")
+@snapshot_cache.memoize
+def load_category_rules() -> pd.DataFrame:
+    import pandas as pd
+
+    with connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT pattern AS Pattern, category AS Category, priority AS Priority
+            FROM category_rules
+            ORDER BY priority DESC, id;
+            """,
+            conn,
+        )
+
+
+@timed("db")
+@snapshot_cache.memoize
+def load_category_matcher() -> CategoryMatcher:
+    rules = load_category_rules()
+    return CategoryMatcher(zip(rules["Pattern"], rules["Category"], rules["Priority"]))
+
+
+@timed("db")
+def set_category_rule(pattern: str, category: str, priority: int = 0):
+    params = (pattern.strip(), category, int(priority))
+    write(
+        lambda conn: conn.execute(
+            """
+            INSERT INTO category_rules (pattern, category, priority)
+            VALUES (?, ?, ?)
+            ON CONFLICT(pattern) DO UPDATE
+            SET category = excluded.category, priority = excluded.priority;
+            """,
+            params,
+        ).rowcount
+    )
+
+
+@timed("db")
+def delete_category_rule(pattern: str):
+    write(
+        lambda conn: conn.execute(
+            "DELETE FROM category_rules WHERE pattern = ?;", (pattern,)
+        ).rowcount
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Expense database maintenance")
+    parser.add_argument("command", choices=["rebuild-rollup"])
+    parser.add_argument("--db", default=DB_FILE, help="path to the SQLite database")
+    args = parser.parse_args()
+
+    DB_FILE = args.db
+    init_db()
+    if args.command == "rebuild-rollup":
+        rebuild_monthly_rollup()
+        print(f"Rebuilt monthly_rollup in {DB_FILE}.")
@@ -1,154 +1,43 @@
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-from sklearn.linear_model import LinearRegression
-import sqlite3
-from datetime import datetime, date
-
-DB_FILE = "expenses.db"
-
-
-# ---------- Database helpers ----------
-
-def get_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Expenses table
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            category TEXT NOT NULL,
-            amount REAL NOT NULL,
-            source TEXT,
-            created_at TEXT DEFAULT (datetime('now'))
-        );
-        """
-    )
-
-    # Budgets table
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS budgets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL UNIQUE,
-            monthly_budget REAL NOT NULL
-        );
-        """
-    )
-
-    conn.commit()
-    conn.close()
-
-
-def load_expenses() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql_query(
-        "SELECT date AS Date, category AS Category, amount AS Amount FROM expenses ORDER BY date;",
-        conn,
-    )
-    conn.close()
-    if not df.empty:
-        df["Date"] = pd.to_datetime(df["Date"])
-    return df
-
-
-def load_budgets() -> dict:
-    conn = get_connection()
-    df = pd.read_sql_query(
-        "SELECT category AS Category, monthly_budget AS Budget FROM budgets ORDER BY category;",
-        conn,
-    )
-    conn.close()
-    if df.empty:
-        return {}
-    return dict(zip(df["Category"], df["Budget"]))
-
-
-def set_budget(category: str, amount: float):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO budgets (category, monthly_budget)
-        VALUES (?, ?)
-        ON CONFLICT(category) DO UPDATE SET monthly_budget = excluded.monthly_budget;
-        """,
-        (category, float(amount)),
-    )
-    conn.commit()
-    conn.close()
-
-
-def add_expense(date_value, category: str, amount: float, source: str = "manual"):
-    conn = get_connection()
-    cur = conn.cursor()
-    if isinstance(date_value, (datetime, date)):
-        date_str = date_value.strftime("%Y-%m-%d")
-    else:
-        date_str = str(date_value)
-    cur.execute(
-        "INSERT INTO expenses (date, category, amount, source) VALUES (?, ?, ?, ?);",
-        (date_str, category, float(amount), source),
-    )
-    conn.commit()
-    conn.close()
-
-
-def get_budget_vs_actual(expense_df: pd.DataFrame, budgets: dict) -> pd.DataFrame:
-    if expense_df.empty or not budgets:
-        return pd.DataFrame(
-            columns=["Category", "Actual", "Budget", "Variance", "Variance_%"]
-        )
-
-    cat_totals = (
-        expense_df.groupby("Category")["Amount"]
-        .sum()
-        .reset_index()
-        .rename(columns={"Amount": "Actual"})
-    )
-    cat_totals["Budget"] = cat_totals["Category"].map(budgets).fillna(0.0)
-    cat_totals["Variance"] = cat_totals["Actual"] - cat_totals["Budget"]
-    cat_totals["Variance_%"] = np.where(
-        cat_totals["Budget"] > 0,
-        cat_totals["Variance"] / cat_totals["Budget"],
-        np.nan,
-    )
-    return cat_totals
-
+import time
 
-def auto_category(description: str) -> str:
-    if not isinstance(description, str):
-        return "Uncategorized"
+import streamlit as st
 
-    desc = description.upper()
-    if "UBER" in desc or "LYFT" in desc or "TAXI" in desc:
-        return "Transport"
-    if "STARBUCKS" in desc or "COFFEE" in desc:
-        return "Coffee"
-    if "WALMART" in desc or "GROCERY" in desc or "SUPERMARKET" in desc:
-        return "Groceries"
-    if "RENT" in desc:
-        return "Rent"
-    if "NETFLIX" in desc or "SPOTIFY" in desc or "SUBSCRIPTION" in desc:
-        return "Subscriptions"
-    if "GYM" in desc or "FITNESS" in desc:
-        return "Fitness"
-    return "Uncategorized"
+import import_jobs
+import instrumentation
+
+# pandas, the chart service and the import/forecast modules are imported
+# inside the pages that use them, so a cold start (and the Add Expense page) skips them.
+from db import (
+    add_expense,
+    delete_category_rule,
+    init_db,
+    load_budgets,
+    load_category_rules,
+    set_budget,
+    set_category_rule,
+)
+from queries import (
+    BROWSE_SORT_COLUMNS,
+    ExpenseFilters,
+    browse_expenses,
+    budget_vs_actual,
+    budget_vs_actual_by_month,
+    category_totals,
+    daily_totals,
+    expense_categories,
+    expense_count,
+    expense_sources,
+    expense_years,
+    monthly_totals,
+    total_spent,
+)
 
 
 # ---------- Streamlit app ----------
 
 init_db()
+# Starts the import worker once per process; it resumes interrupted imports.
+import_jobs.get_worker()
 
 st.title("Personal Expense Tracker with Financial Insights")
 
@@ -162,11 +51,16 @@ menu = st.sidebar.selectbox(
         "Set Budget",
         "Forecast Expenses",
         "Import CSV Data",
+        "Category Rules",
+        "Performance",
     ],
 )
+page_started = time.perf_counter()
+sections = instrumentation.PageSections(menu)
 
-# Always load fresh snapshots from the DB for this run
-expense_data = load_expenses()
+# Snapshots are cached until the next write, so reruns that don't change
+# anything never go back to the database for them.
+has_expenses = expense_count() > 0
 budgets = load_budgets()
 
 
@@ -184,146 +78,211 @@ if menu == "Add Expense":
             st.error("Amount must be greater than 0.")
         else:
             add_expense(date_input, category_input, amount_input, source="manual")
-            st.success("Expense added successfully! Please rerun or change page to refresh views.")
+            st.success("Expense added successfully!")
 
 
 # 2. View Analysis
 elif menu == "View Analysis":
+    import functools
+
+    import charts
+    from export import EXPORT_FORMATS, MIME_TYPES, export_file
+
     st.header("Expense Analysis")
 
-    if expense_data.empty:
+    if not has_expenses:
         st.write("No expenses recorded yet.")
     else:
-        total_expenses = expense_data["Amount"].sum()
+        sections.begin("Summary")
+        total_expenses = total_spent()
         st.metric("Total Expenses", f"${total_expenses:,.2f}")
 
+        sections.begin("Raw Expense Table")
         st.subheader("Raw Expense Table")
-        st.dataframe(expense_data.sort_values("Date", ascending=False))
+        filter_cols = st.columns(3)
+        date_range = filter_cols[0].date_input("Date range", value=[])
+        selected_categories = filter_cols[1].multiselect("Categories", expense_categories())
+        selected_sources = filter_cols[2].multiselect("Sources", expense_sources())
+        amount_cols = st.columns(5)
+        min_amount = amount_cols[0].number_input("Min amount", value=None, step=1.0)
+        max_amount = amount_cols[1].number_input("Max amount", value=None, step=1.0)
+        sort_by = amount_cols[2].selectbox("Sort by", list(BROWSE_SORT_COLUMNS))
+        descending = amount_cols[3].selectbox("Order", ["Descending", "Ascending"]) == "Descending"
+        page_size = amount_cols[4].selectbox("Rows per page", [25, 50, 100, 250], index=1)
+
+        filters = ExpenseFilters(
+            start=date_range[0] if len(date_range) > 0 else None,
+            end=date_range[1] if len(date_range) > 1 else None,
+            categories=tuple(selected_categories),
+            sources=tuple(selected_sources),
+            min_amount=min_amount,
+            max_amount=max_amount,
+        )
+        # Start over from the first page whenever the query changes; the stack
+        # holds the keyset cursor that opens each page visited so far.
+        browser_query = (filters, sort_by, descending, page_size)
+        if st.session_state.get("browser_query") != browser_query:
+            st.session_state.browser_query = browser_query
+            st.session_state.browser_cursors = [None]
+        cursors = st.session_state.browser_cursors
+
+        page_df, next_cursor = browse_expenses(
+            filters, sort_by, descending, cursors[-1], page_size
+        )
+        st.dataframe(page_df, hide_index=True)
 
-        category_totals = (
-            expense_data.groupby("Category")["Amount"].sum().sort_values(ascending=False)
+        nav_cols = st.columns([1, 1, 4])
+        nav_cols[0].button(
+            "Previous", disabled=len(cursors) == 1, on_click=cursors.pop
+        )
+        nav_cols[1].button(
+            "Next", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,)
+        )
+        nav_cols[2].write(f"Page {len(cursors)}")
+
+        # Generated on click, off the page script: rows are streamed from
+        # the database into a temporary file chunk by chunk. Streamlit holds
+        # the finished file for the download; for very large ledgers use
+        # `python Financial_Tracker.py export` instead.
+        export_cols = st.columns([1, 3])
+        export_format = export_cols[0].selectbox("Export format", EXPORT_FORMATS)
+        export_cols[1].download_button(
+            "Export filtered expenses",
+            data=functools.partial(export_file, export_format, filters),
+            file_name=f"expenses.{export_format}",
+            mime=MIME_TYPES[export_format],
+            on_click="ignore",
+            help="Built when clicked and held in memory to serve; for large "
+            "ledgers `python Financial_Tracker.py export` streams to a file instead.",
         )
+
+        sections.begin("Expenses by Category")
+        totals_by_category = category_totals()
         st.subheader("Expenses by Category")
-        st.table(category_totals)
+        st.table(totals_by_category)
 
-        highest_category = category_totals.idxmax()
-        highest_amount = category_totals.max()
+        highest_category = totals_by_category.idxmax()
+        highest_amount = totals_by_category.max()
         st.write(
             f"**Highest Spending Category:** {highest_category} (${highest_amount:,.2f})"
         )
 
+        sections.begin("Monthly Totals and 3-Month Rolling Average")
         # Rolling metrics
-        expense_data_sorted = expense_data.sort_values("Date")
-        expense_data_sorted["Month"] = expense_data_sorted["Date"].dt.to_period("M")
-        monthly_totals = (
-            expense_data_sorted.groupby("Month")["Amount"].sum().reset_index()
-        )
-        monthly_totals["Month"] = monthly_totals["Month"].dt.to_timestamp()
-        monthly_totals["Rolling_3M"] = (
-            monthly_totals["Amount"].rolling(window=3).mean()
+        monthly_df = monthly_totals().assign(
+            Rolling_3M=lambda df: df["Amount"].rolling(window=3).mean()
         )
 
         st.subheader("Monthly Totals and 3-Month Rolling Average")
-        fig, ax = plt.subplots()
-        ax.plot(
-            monthly_totals["Month"],
-            monthly_totals["Amount"],
-            marker="o",
-            label="Monthly Total",
-        )
-        ax.plot(
-            monthly_totals["Month"],
-            monthly_totals["Rolling_3M"],
-            marker="o",
-            linestyle="--",
-            label="3-Month Rolling Avg",
-        )
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Amount")
-        ax.set_title("Monthly Expenses & Rolling Average")
-        ax.legend()
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(charts.monthly_rolling_chart(monthly_df))
 
 
 # 3. Budget vs Actual
 elif menu == "Budget vs Actual":
+    import calendar
+
+    import charts
+
     st.header("Budget vs Actual Analysis")
 
-    if expense_data.empty:
+    if not has_expenses:
         st.write("No expenses recorded yet.")
     elif not budgets:
         st.write("No budgets set yet. Go to 'Set Budget' to add some.")
     else:
-        variance_df = get_budget_vs_actual(expense_data, budgets)
-        st.subheader("Budget vs Actual by Category")
-        st.dataframe(
-            variance_df.style.format(
-                {
-                    "Actual": "{:,.2f}",
-                    "Budget": "{:,.2f}",
-                    "Variance": "{:,.2f}",
-                    "Variance_%": "{:.1%}",
-                }
-            )
+        money_format = {
+            "Actual": "{:,.2f}",
+            "Budget": "{:,.2f}",
+            "Variance": "{:,.2f}",
+            "Variance_%": "{:.1%}",
+        }
+        period = st.radio(
+            "Period", ["Month", "Date range", "Year by month", "All time"], horizontal=True
         )
 
+        sections.begin("Budget vs Actual")
+        if period == "Year by month":
+            year = st.selectbox("Year", expense_years()[::-1])
+            by_month = budget_vs_actual_by_month(year)
+
+            st.subheader(f"Monthly Totals, {year}")
+            month_totals = budget_vs_actual_by_month(year, by="Month")[
+                ["Month", "Actual", "Budget", "Variance"]
+            ]
+            month_totals["Month"] = month_totals["Month"].dt.strftime("%b")
+            st.dataframe(
+                month_totals.style.format({k: money_format[k] for k in month_totals.columns[1:]}),
+                hide_index=True,
+            )
+
+            st.subheader("Variance by Month and Category")
+            variance_matrix = by_month.pivot(
+                index="Category", columns="Month", values="Variance"
+            )
+            variance_matrix.columns = variance_matrix.columns.strftime("%b")
+            st.dataframe(variance_matrix.style.format("{:,.2f}"))
+            variance_df = budget_vs_actual_by_month(year, by="Category")
+        else:
+            if period == "Month":
+                month_options = [m.date() for m in monthly_totals()["Month"].dropna()[::-1]]
+                month = st.selectbox(
+                    "Month", month_options, format_func=lambda d: d.strftime("%B %Y")
+                )
+                start = month
+                end = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+            elif period == "Date range":
+                picked = st.date_input("Date range", value=[])
+                start = picked[0] if len(picked) > 0 else None
+                end = picked[1] if len(picked) > 1 else start
+            else:
+                start = end = None
+
+            st.caption(
+                "Monthly budgets are prorated by how much of each month the period covers."
+            )
+            variance_df = budget_vs_actual(start, end)
+            st.subheader("Budget vs Actual by Category")
+            st.dataframe(variance_df.style.format(money_format), hide_index=True)
+
+        sections.begin("Variance by Category")
         # Simple bar chart of variance
         st.subheader("Variance by Category")
-        fig, ax = plt.subplots()
-        ax.bar(variance_df["Category"], variance_df["Variance"])
-        ax.set_xlabel("Category")
-        ax.set_ylabel("Variance (Actual - Budget)")
-        ax.set_title("Budget Variance by Category")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(charts.variance_bar_chart(variance_df))
 
 
 # 4. Visualize Data
 elif menu == "Visualize Data":
+    import charts
+
     st.header("Visualize Data")
 
-    if expense_data.empty:
+    if not has_expenses:
         st.write("No expenses recorded yet.")
     else:
+        sections.begin("Spending by Category")
         # Category totals
-        category_totals = (
-            expense_data.groupby("Category")["Amount"].sum().sort_values(ascending=False)
-        )
+        totals_by_category = category_totals()
 
         st.subheader("Spending by Category")
-        fig1, ax1 = plt.subplots()
-        ax1.pie(
-            category_totals,
-            labels=category_totals.index,
-            autopct="%1.1f%%",
-            startangle=140,
-        )
-        ax1.axis("equal")
-        st.pyplot(fig1)
+        st.image(charts.category_pie_chart(totals_by_category))
 
+        sections.begin("Monthly Expenses")
         # Monthly bar chart
         st.subheader("Monthly Expenses")
-        expense_data["Month"] = expense_data["Date"].dt.to_period("M")
-        monthly_totals = (
-            expense_data.groupby("Month")["Amount"].sum().reset_index()
-        )
-        monthly_totals["Month"] = monthly_totals["Month"].dt.to_timestamp()
+        monthly_df = monthly_totals()
 
-        fig2, ax2 = plt.subplots()
-        ax2.bar(monthly_totals["Month"], monthly_totals["Amount"])
-        ax2.set_title("Monthly Expenses")
-        ax2.set_xlabel("Month")
-        ax2.set_ylabel("Total Expenses")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig2)
+        st.image(charts.monthly_bar_chart(monthly_df))
+
+        sections.begin("Daily Expenses")
+        # Daily line, bucketed once the history gets long
+        st.subheader("Daily Expenses")
+        st.image(charts.daily_line_chart(daily_totals()))
 
 
 # 5. Set Budget
 elif menu == "Set Budget":
+    import pandas as pd
+
     st.header("Set Budget")
 
     category = st.text_input("Category")
@@ -337,6 +296,7 @@ elif menu == "Set Budget":
         else:
             set_budget(category, budget)
             st.success(f"Budget for {category} set to ${budget:,.2f}.")
+            budgets = load_budgets()
 
     st.subheader("Current Budgets")
     if budgets:
@@ -350,123 +310,203 @@ elif menu == "Set Budget":
 
 # 6. Forecast Expenses
 elif menu == "Forecast Expenses":
+    import charts
+
+    from backtesting import MIN_TRAIN_MONTHS, best_models
+    from forecasting import TOTAL_SERIES
+
     st.header("Forecast Future Expenses")
 
     months_ahead = st.slider("Months to Forecast", 1, 12, 3)
 
     if st.button("Run Forecast"):
-        if expense_data.empty:
+        if not has_expenses:
             st.write("No expenses recorded yet.")
         else:
-            df = expense_data.copy()
-            df["Month"] = df["Date"].dt.to_period("M")
-            monthly_totals = (
-                df.groupby("Month")["Amount"].sum().reset_index()
-            )
-            monthly_totals["Month"] = monthly_totals["Month"].dt.to_timestamp()
-            monthly_totals["Month_Index"] = np.arange(len(monthly_totals))
-
-            X = monthly_totals[["Month_Index"]].values
-            y = monthly_totals["Amount"].values
-
-            if len(monthly_totals) < 4:
-                # Too few points for meaningful train/test split, fall back to simple fit
-                model = LinearRegression()
-                model.fit(X, y)
-                train_r2 = model.score(X, y)
-                test_mae = None
+            sections.begin("Model Selection")
+            # The model search is cached until the next write, so only the
+            # first press after new data pays for it.
+            result = best_models()
+            forecast = result.forecast(months_ahead)
+
+            st.subheader("Model Selection")
+            if result.folds:
+                st.write(
+                    f"Best model for the total: **{result.best[TOTAL_SERIES]}**, "
+                    f"backtested from {result.folds} rolling origins."
+                )
+                st.write("Mean absolute error by months ahead (all categories):")
+                st.dataframe(result.horizon_mae().round(2))
+                st.write("Mean absolute error over all horizons, per series:")
+                st.dataframe(result.summary.round(2).assign(Best=result.best))
             else:
-                # Use all but last 3 months for training, last up to 3 months as test
-                split_idx = max(1, len(monthly_totals) - 3)
-                X_train, X_test = X[:split_idx], X[split_idx:]
-                y_train, y_test = y[:split_idx], y[split_idx:]
-
-                model = LinearRegression()
-                model.fit(X_train, y_train)
-                train_r2 = model.score(X_train, y_train)
-
-                if len(X_test) > 0:
-                    y_pred_test = model.predict(X_test)
-                    test_mae = np.mean(np.abs(y_test - y_pred_test))
-                else:
-                    test_mae = None
-
-            future_indices = np.arange(
-                len(monthly_totals), len(monthly_totals) + months_ahead
-            ).reshape(-1, 1)
-            future_expenses = model.predict(future_indices)
-
-            st.subheader("Model Performance")
-            st.write(f"Train R²: **{train_r2:.3f}**")
-            if test_mae is not None:
-                st.write(f"Test MAE (last {len(X_test)} months): **${test_mae:,.2f}**")
-
-            forecast_df = pd.DataFrame(
-                {
-                    "Month_Index": future_indices.flatten(),
-                    "Predicted Expense": future_expenses,
-                }
-            )
+                st.write(
+                    f"Backtesting needs more than {MIN_TRAIN_MONTHS} months of history; "
+                    "using a linear trend."
+                )
+
+            sections.begin("Forecast Tables")
             st.subheader("Forecasted Expenses (Next Months)")
-            st.table(forecast_df[["Month_Index", "Predicted Expense"]])
+            st.table(
+                forecast[["Month_Index", TOTAL_SERIES]].rename(
+                    columns={TOTAL_SERIES: "Predicted Expense"}
+                )
+            )
+
+            st.subheader("Forecast by Category")
+            st.dataframe(forecast.drop(columns=TOTAL_SERIES).set_index("Month_Index"))
 
+            sections.begin("Forecast Chart")
             # Plot historical + forecast
-            fig, ax = plt.subplots()
-            ax.plot(
-                monthly_totals["Month_Index"],
-                monthly_totals["Amount"],
-                marker="o",
-                label="Historical",
-            )
-            ax.plot(
-                forecast_df["Month_Index"],
-                forecast_df["Predicted Expense"],
-                marker="o",
-                linestyle="--",
-                label="Forecast",
-            )
-            ax.set_title("Expense Forecast")
-            ax.set_xlabel("Month Index")
-            ax.set_ylabel("Total Expenses")
-            ax.legend()
-            plt.tight_layout()
-            st.pyplot(fig)
+            st.image(charts.forecast_chart(result.history, forecast, TOTAL_SERIES))
 
 
 # 7. Import CSV Data
 elif menu == "Import CSV Data":
+    import pandas as pd
+
     st.header("Import Bank Statement CSV")
 
     uploaded = st.file_uploader("Upload CSV file", type=["csv"])
     if uploaded is not None:
-        df_raw = pd.read_csv(uploaded)
+        # Only the head is parsed here; the full file is streamed by the job.
+        df_preview = pd.read_csv(uploaded, nrows=5)
         st.write("Preview of uploaded data:")
-        st.dataframe(df_raw.head())
+        st.dataframe(df_preview)
 
-        columns = list(df_raw.columns)
+        columns = list(df_preview.columns)
         date_col = st.selectbox("Select Date column", columns)
         amount_col = st.selectbox("Select Amount column", columns)
         desc_col = st.selectbox(
             "Select Description column (optional)", ["(none)"] + columns
         )
+        account = st.text_input(
+            "Account",
+            value="import",
+            help="Stored as the rows' source. Rows already imported from the "
+            "same account are skipped, so overlapping statements are safe to import.",
+        )
 
         if st.button("Import Rows"):
-            imported_count = 0
-            for _, row in df_raw.iterrows():
-                try:
-                    dt_val = pd.to_datetime(row[date_col]).date()
-                    amt_val = float(row[amount_col])
-                    if desc_col != "(none)":
-                        cat_val = auto_category(row[desc_col])
-                    else:
-                        cat_val = "Uncategorized"
-
-                    if amt_val != 0:
-                        add_expense(dt_val, cat_val, amt_val, source="import")
-                        imported_count += 1
-                except Exception:
-                    # Skip problematic rows
-                    continue
-
-            st.success(f"Imported {imported_count} rows into the database.")
-            st.info("Change page or rerun the app to see updated views.")
+            uploaded.seek(0)
+            job_id = import_jobs.submit_job(
+                uploaded,
+                uploaded.name,
+                date_col,
+                amount_col,
+                None if desc_col == "(none)" else desc_col,
+                account.strip() or "import",
+            )
+            st.success(f"Import job {job_id} queued; it keeps running if you leave this page.")
+
+    # Imports run on a background worker; this section polls their progress
+    # while any of them is still active.
+    jobs = import_jobs.recent_jobs()
+    polling = any(job.active for job in jobs)
+
+    @st.fragment(run_every=1.0 if polling else None)
+    def import_job_status():
+        jobs = import_jobs.recent_jobs()
+        if polling and not any(job.active for job in jobs):
+            # Refresh the whole app so pages pick up the new rows
+            st.rerun()
+        if jobs:
+            st.subheader("Import Jobs")
+        for job in jobs:
+            label = f"#{job.id} {job.file_name}: {job.status}"
+            if job.total_rows:
+                label += f" ({min(job.rows_done, job.total_rows):,} of {job.total_rows:,} rows)"
+            st.progress(job.progress, text=label)
+            if job.status == "failed":
+                message = job.error
+                if job.imported:
+                    message += f". The {job.imported} rows imported before it were kept."
+                st.error(message)
+            elif job.status == "done":
+                summary = f"Imported {job.imported} new rows."
+                if job.duplicates:
+                    summary += f" Skipped {job.duplicates} rows already in the ledger."
+                if job.skipped_zero:
+                    summary += f" Skipped {job.skipped_zero} rows with a zero amount."
+                st.write(summary)
+            if job.rejected and not job.active:
+                with st.expander(f"{job.rejected} rows could not be parsed"):
+                    st.dataframe(import_jobs.job_rejects(job.id), hide_index=True)
+
+    import_job_status()
+
+
+# 8. Category Rules
+elif menu == "Category Rules":
+    st.header("Auto-Categorization Rules")
+    st.write(
+        "Imported descriptions containing a pattern (case-insensitive) get its "
+        "category. When several patterns match, the highest priority wins."
+    )
+
+    pattern_input = st.text_input("Pattern (e.g. WHOLE FOODS)")
+    rule_category_input = st.text_input("Category")
+    priority_input = st.number_input("Priority", value=0, step=1)
+
+    if st.button("Save Rule"):
+        if not pattern_input.strip() or not rule_category_input:
+            st.error("Please enter both a pattern and a category.")
+        else:
+            set_category_rule(pattern_input, rule_category_input, priority_input)
+            st.success(f"Rule '{pattern_input.strip()}' -> {rule_category_input} saved.")
+
+    rules_df = load_category_rules()
+    st.subheader("Current Rules")
+    if rules_df.empty:
+        st.write("No rules defined yet.")
+    else:
+        st.dataframe(rules_df)
+        pattern_to_delete = st.selectbox("Delete rule", rules_df["Pattern"])
+        if st.button("Delete Rule"):
+            delete_category_rule(pattern_to_delete)
+            st.success(f"Rule '{pattern_to_delete}' deleted.")
+
+
+# 9. Performance
+elif menu == "Performance":
+    import pandas as pd
+
+    st.header("Performance Diagnostics")
+
+    if not instrumentation.ENABLED:
+        st.info(
+            "Instrumentation is off. Start the app with EXPENSE_TRACKER_PROFILE=1 "
+            "to time DB helpers, SQL statements, pages and chart renders."
+        )
+    else:
+        stats = pd.DataFrame(instrumentation.operation_stats())
+        st.subheader("Slowest Operations (by p95)")
+        if stats.empty:
+            st.write("Nothing recorded yet; use the other pages first.")
+        else:
+            st.dataframe(stats.head(50), hide_index=True)
+
+        st.subheader("Query Log")
+        queries_df = pd.DataFrame(instrumentation.query_log())
+        if queries_df.empty:
+            st.write("No SQL recorded yet.")
+        else:
+            slowest_first = st.checkbox("Slowest first")
+            if slowest_first:
+                queries_df = queries_df.sort_values("Duration_ms", ascending=False)
+            st.dataframe(queries_df, hide_index=True)
+
+        st.download_button(
+            "Download trace (Chrome trace format)",
+            data=instrumentation.export_trace(),
+            file_name="expense_tracker_trace.json",
+            mime="application/json",
+        )
+        if st.button("Reset measurements"):
+            instrumentation.reset()
+            st.success("Measurements cleared.")
+
+
+sections.end()
+if instrumentation.ENABLED:
+    instrumentation.record("page", menu, page_started, time.perf_counter())
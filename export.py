@@ -0,0 +1,183 @@
+"""Chunked export of expenses as CSV, JSON Lines or Parquet.
+
+Rows come from a single cursor with ``fetchmany`` and are encoded and
+written one chunk at a time. ``write_export`` into a file (the CLI's
+``export`` command) therefore keeps memory flat however large the ledger
+is. The dashboard's download goes through ``export_file``: the export is
+spooled the same way, but Streamlit then holds the finished file in memory
+to serve it and only sends it once it is complete. Filters are the raw
+expense browser's (``queries.ExpenseFilters``).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, List
+
+import db
+from queries import ExpenseFilters
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+MIME_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/jsonl",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_COLUMNS = ("id", "date", "category", "amount", "source")
+# Rows per fetchmany() and per encoded block (a Parquet row group)
+FETCH_ROWS = 10_000
+# The scan reads each page once, so the connection's usual 64 MiB page
+# cache would only grow with the ledger (in KiB, as in CONNECTION_PRAGMAS)
+EXPORT_CACHE_KIB = 2048
+
+
+def iter_row_chunks(filters: ExpenseFilters = ExpenseFilters()) -> Iterator[List[tuple]]:
+    """Yield lists of (id, date, category, amount_cents, source), date order."""
+    conditions, params = filters.conditions()
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # A connection of its own: the generator may be consumed, or abandoned,
+    # from a thread other than the one that created it. Its read transaction
+    # gives the export one consistent snapshot.
+    conn = db.get_connection()
+    conn.row_factory = None
+    conn.execute(f"PRAGMA cache_size=-{EXPORT_CACHE_KIB};")
+    # Rows are read in date-index order, so ORDER BY never needs a sort that
+    # grows with the matching rows (with category filters the planner would
+    # otherwise pick the category index and sort). Anything that does spill
+    # goes to disk rather than the in-memory temp store.
+    conn.execute("PRAGMA temp_store=FILE;")
+    try:
+        cursor = conn.execute(
+            f"""
+            SELECT id, date, category, amount_cents, source
+            FROM expenses INDEXED BY idx_expenses_date {where}
+            ORDER BY date, id;
+            """,
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def _amount_text(cents: int) -> str:
+    # Exact two-decimal text straight from the integer cents
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def encode_csv(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(
+            (row_id, day, category, _amount_text(cents), source)
+            for row_id, day, category, cents, source in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_jsonl(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    for rows in chunks:
+        lines = [
+            json.dumps(
+                {
+                    "id": row_id,
+                    "date": day,
+                    "category": category,
+                    "amount": cents / 100,
+                    "source": source,
+                }
+            )
+            for row_id, day, category, cents, source in rows
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def encode_parquet(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from exc
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("date", pa.string()),
+            ("category", pa.string()),
+            ("amount", pa.float64()),
+            ("source", pa.string()),
+        ]
+    )
+    sink = _ByteSink()
+    # One row group per fetched chunk, sent as soon as it is written
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in chunks:
+            ids, days, categories, cents, sources = zip(*rows)
+            columns = [ids, days, categories, pa.array(cents, pa.int64()).to_numpy() / 100, sources]
+            writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+ENCODERS = {"csv": encode_csv, "jsonl": encode_jsonl, "parquet": encode_parquet}
+
+
+def write_export(fh: BinaryIO, fmt: str, filters: ExpenseFilters = ExpenseFilters()) -> int:
+    """Stream the export into ``fh``; returns the number of rows written."""
+    written = 0
+
+    def counted():
+        nonlocal written
+        for rows in iter_row_chunks(filters):
+            written += len(rows)
+            yield rows
+
+    for block in ENCODERS[fmt](counted()):
+        fh.write(block)
+    return written
+
+
+def export_file(fmt: str, filters: ExpenseFilters = ExpenseFilters()) -> BinaryIO:
+    """The export spooled to an anonymous temporary file, rewound."""
+    fh = tempfile.TemporaryFile()
+    write_export(fh, fmt, filters)
+    fh.seek(0)
+    return fh
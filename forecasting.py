@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+TOTAL_SERIES = "All Categories"
+# Months held out to measure forecast error, once there are enough of them.
+TEST_MONTHS = 3
+MIN_MONTHS_FOR_TEST = 4
+
+
+@dataclass
+class ForecastResult:
+    history: pd.DataFrame  # month x series, with a Month_Index column
+    forecast: pd.DataFrame  # future Month_Index x series
+    metrics: pd.DataFrame  # series x [Train_R2, Test_MAE]
+    test_months: int
+
+    def series(self, name: str = TOTAL_SERIES) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "Month_Index": self.forecast["Month_Index"],
+                "Predicted Expense": self.forecast[name],
+            }
+        )
+
+
+def with_total(matrix: pd.DataFrame) -> pd.DataFrame:
+    """Copy of a month x category matrix with the total as its first column."""
+    history = matrix.copy()
+    history.insert(0, TOTAL_SERIES, matrix.sum(axis=1))
+    return history
+
+
+def fit_linear_trend(t: np.ndarray, Y: np.ndarray) -> np.ndarray:
+    """Least-squares intercept and slope for every column of Y at once.
+
+    Returns a (2, k) coefficient matrix. Rank-deficient inputs (a single
+    month) get the minimum-norm solution, i.e. a flat line through the point.
+    """
+    X = np.column_stack([np.ones_like(t, dtype=float), t])
+    coef, *_ = np.linalg.lstsq(X, Y, rcond=None)
+    return coef
+
+
+def predict_linear_trend(coef: np.ndarray, t: np.ndarray) -> np.ndarray:
+    return coef[0] + np.outer(t, coef[1])
+
+
+def r2_scores(Y: np.ndarray, Y_pred: np.ndarray) -> np.ndarray:
+    ss_res = ((Y - Y_pred) ** 2).sum(axis=0)
+    ss_tot = ((Y - Y.mean(axis=0)) ** 2).sum(axis=0)
+    # Same convention as scikit-learn for constant targets.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = 1.0 - ss_res / ss_tot
+    return np.where(ss_tot > 0, r2, np.where(ss_res > 0, 0.0, 1.0))
+
+
+def forecast_all(
+    matrix: pd.DataFrame,
+    months_ahead: int = 3,
+    test_months: Optional[int] = TEST_MONTHS,
+) -> ForecastResult:
+    """Fit a linear trend to the total and every category in one solve.
+
+    ``matrix`` is a month x category frame of totals (see
+    ``queries.monthly_category_totals``). With at least four months the last
+    ``test_months`` are held out for MAE and the trend is fit on the rest;
+    otherwise it is fit on everything and no test error is reported.
+    """
+    history = with_total(matrix)
+    Y = history.to_numpy(dtype=float)
+    n = len(history)
+    t = np.arange(n, dtype=float)
+
+    if n < MIN_MONTHS_FOR_TEST or not test_months:
+        split = n
+    else:
+        split = max(1, n - test_months)
+
+    coef = fit_linear_trend(t[:split], Y[:split])
+    train_r2 = r2_scores(Y[:split], predict_linear_trend(coef, t[:split]))
+    if split < n:
+        test_mae = np.abs(Y[split:] - predict_linear_trend(coef, t[split:])).mean(axis=0)
+    else:
+        test_mae = np.full(Y.shape[1], np.nan)
+
+    future_t = np.arange(n, n + months_ahead)
+    forecast = pd.DataFrame(
+        predict_linear_trend(coef, future_t.astype(float)), columns=history.columns
+    )
+    forecast.insert(0, "Month_Index", future_t)
+
+    history.insert(0, "Month_Index", np.arange(n))
+    metrics = pd.DataFrame(
+        {"Train_R2": train_r2, "Test_MAE": test_mae}, index=history.columns[1:]
+    )
+    return ForecastResult(history, forecast, metrics, n - split)
@@ -0,0 +1,399 @@
+"""Background CSV imports with progress and resume.
+
+An upload is copied to a staging file and recorded in ``import_jobs``; a
+worker thread then streams it into ``expenses`` one chunk per transaction.
+Each chunk commits together with the job's progress counters, so the page
+can poll a progress bar, and a job interrupted by a restart picks up after
+its last committed chunk instead of starting over.
+
+    python import_jobs.py submit statement.csv --date-col Date --amount-col Amount
+    python import_jobs.py resume
+"""
+from __future__ import annotations
+
+import os
+import queue
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, List, Optional
+
+import db
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STAGING_DIR = os.environ.get("EXPENSE_IMPORT_STAGING_DIR", "import_staging")
+# A running job whose heartbeat is older than this is treated as abandoned
+# (its process died) and is picked up again. Every committed chunk beats.
+STALE_AFTER_SECONDS = 30.0
+# A resumed job re-reads its committed chunks without writing; it beats at
+# least this often meanwhile so it isn't taken for abandoned.
+SKIP_HEARTBEAT_SECONDS = STALE_AFTER_SECONDS / 3
+COPY_BUFFER_BYTES = 1 << 20
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+@dataclass(frozen=True)
+class ImportJob:
+    id: int
+    file_name: str
+    status: str
+    total_rows: Optional[int]
+    rows_done: int
+    imported: int
+    duplicates: int
+    skipped_zero: int
+    rejected: int
+    error: Optional[str]
+    created_at: str
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        # total_rows counts lines, so quoted newlines can overshoot it
+        return min(1.0, self.rows_done / self.total_rows)
+
+
+JOB_COLUMNS = (
+    "id, file_name, status, total_rows, rows_done, imported, duplicates, "
+    "skipped_zero, rejected, error, created_at"
+)
+
+
+# ---------- Staging and submission ----------
+
+def stage_upload(fileobj: BinaryIO) -> tuple:
+    """Copy an upload into the staging directory; return (path, data rows)."""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".csv", dir=STAGING_DIR)
+    lines = 0
+    last = b"\n"
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = fileobj.read(COPY_BUFFER_BYTES)
+            if not block:
+                break
+            out.write(block)
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    # The header line isn't a row
+    return path, max(0, lines - 1)
+
+
+def create_job(
+    fileobj: BinaryIO,
+    file_name: str,
+    date_col: str,
+    amount_col: str,
+    desc_col: Optional[str],
+    account: str = "import",
+    chunksize: Optional[int] = None,
+) -> int:
+    """Stage ``fileobj`` and record a queued job; returns the job id.
+
+    ``account`` becomes the rows' source and scopes duplicate detection.
+    """
+    from csv_import import DEFAULT_CHUNKSIZE
+
+    path, total_rows = stage_upload(fileobj)
+    with db.transaction() as conn:
+        return conn.execute(
+            """
+            INSERT INTO import_jobs (
+                file_name, staged_path, date_col, amount_col, desc_col, source,
+                chunksize, total_rows
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+            (
+                file_name,
+                os.path.abspath(path),
+                date_col,
+                amount_col,
+                desc_col,
+                account,
+                chunksize or DEFAULT_CHUNKSIZE,
+                total_rows,
+            ),
+        ).lastrowid
+
+
+def submit_job(*args, **kwargs) -> int:
+    """Like ``create_job``, then hand the job to the background worker."""
+    job_id = create_job(*args, **kwargs)
+    get_worker().submit(job_id)
+    return job_id
+
+
+# ---------- Reading job state ----------
+
+def _job(row) -> ImportJob:
+    return ImportJob(**{key: row[key] for key in row.keys()})
+
+
+def get_job(job_id: int) -> Optional[ImportJob]:
+    with db.connection() as conn:
+        row = conn.execute(
+            f"SELECT {JOB_COLUMNS} FROM import_jobs WHERE id = ?;", (job_id,)
+        ).fetchone()
+    return _job(row) if row is not None else None
+
+
+def recent_jobs(limit: int = 10) -> List[ImportJob]:
+    with db.connection() as conn:
+        rows = conn.execute(
+            f"SELECT {JOB_COLUMNS} FROM import_jobs ORDER BY id DESC LIMIT ?;", (limit,)
+        ).fetchall()
+    return [_job(row) for row in rows]
+
+
+def job_rejects(job_id: int) -> pd.DataFrame:
+    import pandas as pd
+
+    with db.connection() as conn:
+        return pd.read_sql_query(
+            "SELECT row AS Row, reason AS Reason FROM import_job_rejects "
+            "WHERE job_id = ? ORDER BY row;",
+            conn,
+            params=(job_id,),
+        )
+
+
+def resumable_job_ids() -> List[int]:
+    with db.connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT id FROM import_jobs
+            WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)
+            ORDER BY id;
+            """,
+            (time.time() - STALE_AFTER_SECONDS,),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+# ---------- Running a job ----------
+
+def _claim(job_id: int):
+    # Only one worker (in any process) may run a job; a stale heartbeat means
+    # the previous owner died mid-job.
+    now = time.time()
+    with db.transaction() as conn:
+        claimed = conn.execute(
+            """
+            UPDATE import_jobs SET status = 'running', heartbeat = ?
+            WHERE id = ?
+              AND (status = 'queued' OR (status = 'running' AND heartbeat < ?));
+            """,
+            (now, job_id, now - STALE_AFTER_SECONDS),
+        ).rowcount
+        if not claimed:
+            return None
+        return conn.execute("SELECT * FROM import_jobs WHERE id = ?;", (job_id,)).fetchone()
+
+
+def _beat(job_id: int):
+    with db.transaction() as conn:
+        conn.execute("UPDATE import_jobs SET heartbeat = ? WHERE id = ?;", (time.time(), job_id))
+
+
+def _finish(job_id: int, status: str, staged_path: str, error: Optional[str] = None):
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE import_jobs SET status = ?, error = ?, heartbeat = ? WHERE id = ?;",
+            (status, error, time.time(), job_id),
+        )
+    try:
+        os.remove(staged_path)
+    except OSError:
+        pass
+
+
+def run_job(job_id: int) -> Optional[ImportJob]:
+    """Run (or resume) a job in the calling thread.
+
+    Returns None when the job isn't claimable: it is finished or another
+    worker is still running it.
+    """
+    from csv_import import (
+        INSERT_EXPENSE_SQL,
+        MAX_REJECT_SAMPLES,
+        OccurrenceCounter,
+        iter_csv_chunks,
+        prepare_chunk,
+    )
+
+    job = _claim(job_id)
+    if job is None:
+        return None
+    categorize = db.load_category_matcher().classify_column
+    rows_seen = 0
+    samples_kept = min(job["rejected"], MAX_REJECT_SAMPLES)
+    occurrences = OccurrenceCounter()
+    last_beat = time.monotonic()
+    try:
+        with iter_csv_chunks(job["staged_path"], job["chunksize"]) as reader:
+            for chunk in reader:
+                first_row = rows_seen + 1
+                rows_seen += len(chunk)
+                # The chunk size is fixed per job, so committed progress always
+                # ends on a chunk boundary and earlier chunks are skipped whole;
+                # they are still fingerprinted to keep occurrence numbers right.
+                done = rows_seen <= job["rows_done"]
+                records, rejects, zero = prepare_chunk(
+                    chunk,
+                    job["date_col"],
+                    job["amount_col"],
+                    job["desc_col"],
+                    None if done else categorize,
+                    first_row=first_row,
+                    source=job["source"],
+                    occurrences=occurrences,
+                )
+                if done:
+                    if time.monotonic() - last_beat >= SKIP_HEARTBEAT_SECONDS:
+                        _beat(job_id)
+                        last_beat = time.monotonic()
+                    continue
+                sample = rejects[: max(0, MAX_REJECT_SAMPLES - samples_kept)]
+                samples_kept += len(sample)
+                with db.transaction() as conn:
+                    inserted = conn.executemany(INSERT_EXPENSE_SQL, records).rowcount
+                    conn.executemany(
+                        "INSERT INTO import_job_rejects (job_id, row, reason) VALUES (?, ?, ?);",
+                        [(job_id, row, reason) for row, reason in sample],
+                    )
+                    conn.execute(
+                        """
+                        UPDATE import_jobs
+                        SET rows_done = ?, imported = imported + ?,
+                            duplicates = duplicates + ?, skipped_zero = skipped_zero + ?,
+                            rejected = rejected + ?, heartbeat = ?
+                        WHERE id = ?;
+                        """,
+                        (
+                            rows_seen,
+                            inserted,
+                            len(records) - inserted,
+                            zero,
+                            len(rejects),
+                            time.time(),
+                            job_id,
+                        ),
+                    )
+                    if inserted:
+                        db.bump_data_version(conn)
+    except Exception as exc:
+        # Chunks committed before the failure stay imported; the job row
+        # records how far it got.
+        _finish(job_id, "failed", job["staged_path"], f"{type(exc).__name__}: {exc}")
+    else:
+        _finish(job_id, "done", job["staged_path"])
+    finally:
+        occurrences.close()
+    return get_job(job_id)
+
+
+class ImportWorker:
+    """Daemon thread running queued jobs one at a time.
+
+    While idle it rescans the table for queued jobs and abandoned running
+    ones, so imports interrupted by a restart resume on their own.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="import-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job_id: int):
+        self._queue.put(job_id)
+
+    def _run(self):
+        while True:
+            try:
+                job_ids = [self._queue.get(timeout=STALE_AFTER_SECONDS)]
+            except queue.Empty:
+                job_ids = []
+            try:
+                for job_id in job_ids or resumable_job_ids():
+                    run_job(job_id)
+            except Exception:
+                # Keep the worker alive; the job row keeps its last state and
+                # is retried on the next scan.
+                time.sleep(1.0)
+
+
+_worker: Optional[ImportWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_worker() -> ImportWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = ImportWorker()
+            for job_id in resumable_job_ids():
+                _worker.submit(job_id)
+        return _worker
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run CSV import jobs")
+    parser.add_argument("--db", default=db.DB_FILE, help="path to the SQLite database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit_parser = sub.add_parser("submit", help="import a CSV file")
+    submit_parser.add_argument("csv")
+    submit_parser.add_argument("--date-col", required=True)
+    submit_parser.add_argument("--amount-col", required=True)
+    submit_parser.add_argument("--desc-col")
+    submit_parser.add_argument("--account", default="import", help="source label of the rows")
+    sub.add_parser("resume", help="finish interrupted jobs")
+    args = parser.parse_args()
+
+    db.DB_FILE = args.db
+    db.init_db()
+    if args.command == "submit":
+        with open(args.csv, "rb") as fh:
+            job_ids = [
+                create_job(
+                    fh,
+                    os.path.basename(args.csv),
+                    args.date_col,
+                    args.amount_col,
+                    args.desc_col,
+                    args.account,
+                )
+            ]
+    else:
+        job_ids = resumable_job_ids()
+        if not job_ids:
+            print(
+                "Nothing to resume. Jobs left running by a stopped process become "
+                f"resumable {STALE_AFTER_SECONDS:.0f}s after their last chunk."
+            )
+    for job_id in job_ids:
+        job = run_job(job_id)
+        if job is None:
+            print(f"Job {job_id} is being run elsewhere.")
+            continue
+        print(
+            f"Job {job.id} ({job.file_name}): {job.status}, imported {job.imported}, "
+            f"skipped {job.duplicates} duplicates and {job.skipped_zero} zero, "
+            f"rejected {job.rejected}."
+        )
+        if job.error:
+            print(f"  {job.error}")
@@ -0,0 +1,251 @@
+"""Opt-in timing of DB helpers, SQL statements, pages, page sections and charts.
+
+Set ``EXPENSE_TRACKER_PROFILE=1`` before starting the app or CLI to turn it
+on. When it is off, ``timed`` returns the undecorated function, ``span``
+returns a shared no-op context and connections are plain sqlite3 ones, so
+the hot paths run exactly the code they would without this module.
+
+Collected data stays in memory: rolling per-operation durations, a query log
+and a trace exportable in the Chrome trace event format (chrome://tracing,
+Perfetto, speedscope).
+"""
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+ENABLED = os.environ.get("EXPENSE_TRACKER_PROFILE", "").lower() in ("1", "true", "yes")
+
+# Samples kept per operation for percentiles, and entries in the query log
+# and trace; older ones roll off.
+WINDOW = 500
+QUERY_LOG_SIZE = 1_000
+TRACE_SIZE = 10_000
+
+_lock = threading.Lock()
+_durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=WINDOW))
+_query_log: deque = deque(maxlen=QUERY_LOG_SIZE)
+_trace: deque = deque(maxlen=TRACE_SIZE)
+_epoch = time.perf_counter()
+_NOOP = nullcontext()
+
+
+def record(category: str, name: str, start: float, end: float, **args):
+    duration_ms = (end - start) * 1000
+    with _lock:
+        _durations[f"{category}:{name}"].append(duration_ms)
+        _trace.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - _epoch) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+
+@contextmanager
+def _span(category: str, name: str, **args):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, name, start, time.perf_counter(), **args)
+
+
+def span(category: str, name: str, **args):
+    return _span(category, name, **args) if ENABLED else _NOOP
+
+
+def timed(category: str) -> Callable:
+    """Decorator timing every call under ``category:<function name>``."""
+
+    def decorator(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(category, fn.__name__, start, time.perf_counter())
+
+        return wrapper
+
+    return decorator
+
+
+class PageSections:
+    """Times consecutive sections of one page run as ``section:<page> / <name>``.
+
+    Each ``begin`` closes the section before it; ``end`` closes the last.
+    """
+
+    def __init__(self, page: str):
+        self.page = page
+        self._name: Optional[str] = None
+        self._start = 0.0
+
+    def begin(self, name: str):
+        self.end()
+        if ENABLED:
+            self._name, self._start = name, time.perf_counter()
+
+    def end(self):
+        if self._name is not None:
+            record("section", f"{self.page} / {self._name}", self._start, time.perf_counter())
+            self._name = None
+
+
+# ---------- SQL tracing ----------
+
+class _QueryEntry:
+    __slots__ = ("sql", "rows", "ms", "thread", "at")
+
+    def __init__(self, sql: str, ms: float):
+        self.sql = " ".join(sql.split())
+        self.rows = 0
+        self.ms = ms
+        self.thread = threading.current_thread().name
+        self.at = time.time()
+
+
+class TracedCursor(sqlite3.Cursor):
+    # Execution time is measured around execute(); rows are counted as they
+    # are fetched (SELECT) or taken from rowcount (DML).
+    _entry: Optional[_QueryEntry] = None
+
+    def _traced(self, method, sql, params):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            end = time.perf_counter()
+            entry = _QueryEntry(sql, (end - start) * 1000)
+            if self.rowcount > 0:
+                entry.rows = self.rowcount
+            self._entry = entry
+            with _lock:
+                _query_log.append(entry)
+            record("sql", entry.sql[:60], start, end, sql=entry.sql)
+
+    def execute(self, sql, params=()):
+        return self._traced(super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._traced(super().executemany, sql, seq_of_params)
+
+    def executescript(self, script):
+        return self._traced(lambda sql, _: super(TracedCursor, self).executescript(sql), script, None)
+
+    def _count(self, rows):
+        if self._entry is not None:
+            self._entry.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None and self._entry is not None:
+            self._entry.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        return self._count(super().fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+    def __next__(self):
+        row = super().__next__()
+        if self._entry is not None:
+            self._entry.rows += 1
+        return row
+
+
+class TracedConnection(sqlite3.Connection):
+    # Connection.execute() and friends create their cursor in C without going
+    # through cursor(), so they are routed through it here to be traced.
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def connection_factory():
+    return TracedConnection if ENABLED else sqlite3.Connection
+
+
+# ---------- Reports ----------
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def operation_stats() -> List[dict]:
+    with _lock:
+        snapshot = {name: list(values) for name, values in _durations.items()}
+    stats = []
+    for name, values in snapshot.items():
+        if not values:
+            continue
+        ordered = sorted(values)
+        stats.append(
+            {
+                "Operation": name,
+                "Calls": len(values),
+                "Mean_ms": sum(values) / len(values),
+                "P50_ms": percentile(ordered, 0.50),
+                "P95_ms": percentile(ordered, 0.95),
+                "P99_ms": percentile(ordered, 0.99),
+                "Max_ms": ordered[-1],
+            }
+        )
+    return sorted(stats, key=lambda s: s["P95_ms"], reverse=True)
+
+
+def query_log(limit: int = 200) -> List[dict]:
+    with _lock:
+        entries = list(_query_log)[-limit:]
+    return [
+        {
+            "At": time.strftime("%H:%M:%S", time.localtime(e.at)),
+            "Duration_ms": e.ms,
+            "Rows": e.rows,
+            "Thread": e.thread,
+            "SQL": e.sql,
+        }
+        for e in reversed(entries)
+    ]
+
+
+def export_trace() -> str:
+    """Trace events as Chrome trace format JSON."""
+    with _lock:
+        events = list(_trace)
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _query_log.clear()
+        _trace.clear()
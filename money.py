@@ -0,0 +1,39 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+# Money is stored and summed as INTEGER cents so totals are exact; callers
+# still pass and receive ordinary currency amounts, converted here at the
+# edges of the database layer.
+CENTS_PER_UNIT = 100
+
+
+def to_cents(amount) -> int:
+    # Via str() so float noise such as 0.1 + 0.2 can't tip the rounding
+    cents = Decimal(str(amount)) * CENTS_PER_UNIT
+    return int(cents.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+# Scaled values this close to a half cent may be a decimal half (1.005 is
+# 100.49999999999999 as a float) and are rounded by to_cents instead.
+HALF_TOLERANCE = 1e-6
+
+
+def to_cents_array(amounts):
+    """Vectorized ``to_cents`` for a float array or Series, as int64.
+
+    Rounds half away from zero like ``to_cents``; the rare values sitting
+    on a half cent go through ``to_cents`` itself, so both paths agree.
+    """
+    import numpy as np
+
+    values = np.asarray(amounts, dtype=np.float64)
+    scaled = values * CENTS_PER_UNIT
+    cents = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled).astype(np.int64)
+    near_half = np.abs(np.abs(scaled) % 1 - 0.5) < HALF_TOLERANCE
+    for index in np.flatnonzero(near_half):
+        cents[index] = to_cents(values[index])
+    return cents
+
+
+def from_cents(cents):
+    # Works on ints, NumPy arrays and pandas objects alike
+    return cents / CENTS_PER_UNIT
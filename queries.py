@@ -0,0 +1,513 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, replace
+from datetime import datetime, date, timedelta
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from db import connection, snapshot_cache
+from instrumentation import timed
+from money import from_cents, to_cents
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Aggregations run inside SQLite, either over the monthly_rollup table or the
+# (date) and (category, date) indexes, so each page only pulls back the
+# handful of rows it displays. Sums are exact integer cents and are turned
+# into currency amounts only on the way out.
+# Results are memoized until the next write; callers must not mutate them.
+# pandas is imported inside the functions that build frames so pages that
+# only need scalars don't pay for it at startup.
+
+
+def to_iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def date_range_clause(start=None, end=None) -> Tuple[str, List[str]]:
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(to_iso(start))
+    if end is not None:
+        conditions.append("date <= ?")
+        params.append(to_iso(end))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+def month_range_clause(start_month=None, end_month=None) -> Tuple[str, List[str]]:
+    conditions, params = [], []
+    if start_month is not None:
+        conditions.append("month >= ?")
+        params.append(str(start_month)[:7])
+    if end_month is not None:
+        conditions.append("month <= ?")
+        params.append(str(end_month)[:7])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+@timed("query")
+@snapshot_cache.memoize
+def expense_count(start=None, end=None) -> int:
+    with connection() as conn:
+        if start is None and end is None:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM monthly_rollup;"
+            ).fetchone()
+        else:
+            where, params = date_range_clause(start, end)
+            row = conn.execute(
+                f"SELECT COUNT(*) FROM expenses {where};", params
+            ).fetchone()
+    return row[0]
+
+
+@timed("query")
+@snapshot_cache.memoize
+def total_spent(start=None, end=None) -> float:
+    with connection() as conn:
+        if start is None and end is None:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(total_cents), 0) FROM monthly_rollup;"
+            ).fetchone()
+        else:
+            where, params = date_range_clause(start, end)
+            row = conn.execute(
+                f"SELECT COALESCE(SUM(amount_cents), 0) FROM expenses {where};", params
+            ).fetchone()
+    return from_cents(row[0])
+
+
+@timed("query")
+@snapshot_cache.memoize
+def category_totals(start=None, end=None) -> pd.Series:
+    import pandas as pd
+
+    # All-time totals come from the rollup; explicit date ranges scan the
+    # (category, date) index since they may cut through a month.
+    if start is None and end is None:
+        sql, params = (
+            """
+            SELECT category AS Category, SUM(total_cents) AS Amount
+            FROM monthly_rollup
+            GROUP BY category
+            ORDER BY Amount DESC;
+            """,
+            [],
+        )
+    else:
+        where, params = date_range_clause(start, end)
+        sql = f"""
+            SELECT category AS Category, SUM(amount_cents) AS Amount
+            FROM expenses {where}
+            GROUP BY category
+            ORDER BY Amount DESC;
+            """
+    with connection() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    return from_cents(df.set_index("Category")["Amount"])
+
+
+@timed("query")
+@snapshot_cache.memoize
+def monthly_totals(start_month=None, end_month=None) -> pd.DataFrame:
+    import pandas as pd
+
+    where, params = month_range_clause(start_month, end_month)
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT month AS Month, SUM(total_cents) AS Amount
+            FROM monthly_rollup {where}
+            GROUP BY month
+            ORDER BY month;
+            """,
+            conn,
+            params=params,
+        )
+    df["Amount"] = from_cents(df["Amount"])
+    df["Month"] = pd.to_datetime(df["Month"], format="%Y-%m", errors="coerce")
+    return df
+
+
+@timed("query")
+@snapshot_cache.memoize
+def daily_totals(start=None, end=None) -> pd.DataFrame:
+    import pandas as pd
+
+    where, params = date_range_clause(start, end)
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT date AS Date, SUM(amount_cents) AS Amount
+            FROM expenses {where}
+            GROUP BY date
+            ORDER BY date;
+            """,
+            conn,
+            params=params,
+        )
+    df["Amount"] = from_cents(df["Amount"])
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+@timed("query")
+@snapshot_cache.memoize
+def monthly_category_totals(start_month=None, end_month=None) -> pd.DataFrame:
+    import pandas as pd
+
+    # Month x category matrix (zeros where nothing was spent), straight from
+    # the rollup; this is what the forecaster fits.
+    where, params = month_range_clause(start_month, end_month)
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT month AS Month, category AS Category, total_cents AS Amount
+            FROM monthly_rollup {where}
+            ORDER BY month, category;
+            """,
+            conn,
+            params=params,
+        )
+    matrix = from_cents(
+        df.pivot(index="Month", columns="Category", values="Amount").fillna(0)
+    )
+    matrix.index = pd.to_datetime(matrix.index, format="%Y-%m", errors="coerce")
+    matrix.columns.name = None
+    return matrix
+
+
+@timed("query")
+@snapshot_cache.memoize
+def expense_categories() -> List[str]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT category FROM monthly_rollup ORDER BY category;"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+@timed("query")
+@snapshot_cache.memoize
+def expense_sources() -> List[str]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT source FROM expenses WHERE source IS NOT NULL ORDER BY source;"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+# ---------- Raw expense browser ----------
+
+# Sortable columns; pagination is keyset-based on (column, id), so any page
+# costs an index seek plus LIMIT rows no matter how deep it is.
+BROWSE_SORT_COLUMNS = {"Date": "date", "Amount": "amount_cents"}
+BROWSE_PAGE_SIZE = 50
+
+
+@dataclass(frozen=True)
+class ExpenseFilters:
+    start: Optional[date] = None
+    end: Optional[date] = None
+    categories: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+    def conditions(self) -> Tuple[List[str], list]:
+        where, params = date_range_clause(self.start, self.end)
+        conditions = [where[len("WHERE "):]] if where else []
+        if self.categories:
+            conditions.append(f"category IN ({', '.join('?' * len(self.categories))})")
+            params.extend(self.categories)
+        if self.sources:
+            conditions.append(f"source IN ({', '.join('?' * len(self.sources))})")
+            params.extend(self.sources)
+        if self.min_amount is not None:
+            conditions.append("amount_cents >= ?")
+            params.append(to_cents(self.min_amount))
+        if self.max_amount is not None:
+            conditions.append("amount_cents <= ?")
+            params.append(to_cents(self.max_amount))
+        return conditions, params
+
+
+# Index walked in sort order, by (sort column, filtered to one category).
+BROWSE_SORT_INDEXES = {
+    ("date", False): "idx_expenses_date",
+    ("date", True): "idx_expenses_category_date",
+    ("amount_cents", False): "idx_expenses_amount_cents",
+    ("amount_cents", True): "idx_expenses_category_amount_cents",
+}
+# A range filter on the other column than the sort (amounts when sorting by
+# date, dates when sorting by amount) leaves two plans: walk the sort index
+# and filter, costing about page size / selectivity, or read just the
+# matches through the range's index and sort them, costing the match count.
+# Counting up to this many matches picks between them: a page then reads
+# at most this many rows, or about page size x table rows / this many
+# (10k rows at a million) when the range is wider.
+BROWSE_PROBE_ROWS = 5_000
+
+
+def _browse_one(conn, filters: ExpenseFilters, column: str, descending: bool, after, limit: int):
+    """Rows of one page for filters with at most one category, in order."""
+    direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+    conditions, params = filters.conditions()
+    if after is not None:
+        conditions.append(f"({column}, id) {comparison} (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    one_category = bool(filters.categories)
+    index = BROWSE_SORT_INDEXES[(column, one_category)]
+    if column == "date":
+        other, ranged = "amount_cents", (filters.min_amount, filters.max_amount) != (None, None)
+    else:
+        other, ranged = "date", (filters.start, filters.end) != (None, None)
+    if ranged:
+        range_index = BROWSE_SORT_INDEXES[(other, one_category)]
+        matches = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM expenses INDEXED BY {range_index} "
+            f"{where} LIMIT ?);",
+            params + [BROWSE_PROBE_ROWS],
+        ).fetchone()[0]
+        if matches < BROWSE_PROBE_ROWS:
+            index = range_index
+
+    return conn.execute(
+        f"""
+        SELECT id, date, category, amount_cents, source
+        FROM expenses INDEXED BY {index} {where}
+        ORDER BY {column} {direction}, id {direction}
+        LIMIT ?;
+        """,
+        params + [limit],
+    ).fetchall()
+
+
+@timed("query")
+def browse_expenses(
+    filters: ExpenseFilters = ExpenseFilters(),
+    sort_by: str = "Date",
+    descending: bool = True,
+    after: Optional[tuple] = None,
+    page_size: int = BROWSE_PAGE_SIZE,
+) -> Tuple[pd.DataFrame, Optional[tuple]]:
+    """Return one page of raw expenses and the cursor for the next page.
+
+    ``after`` is the cursor returned for the previous page (None for the
+    first); the returned cursor is None on the last page.
+    """
+    import pandas as pd
+
+    column = BROWSE_SORT_COLUMNS[sort_by]
+    # One seek per selected category, merged here: an IN list over the
+    # (category, ...) indexes would come back in category order and need a
+    # sort of every matching row.
+    if len(filters.categories) > 1:
+        parts = [replace(filters, categories=(category,)) for category in filters.categories]
+    else:
+        parts = [filters]
+    with connection() as conn:
+        # One extra row tells whether another page follows.
+        runs = [_browse_one(conn, part, column, descending, after, page_size + 1) for part in parts]
+    rows = list(
+        heapq.merge(*runs, key=lambda row: (row[column], row["id"]), reverse=descending)
+    )[: page_size + 1]
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1][column], rows[-1]["id"]) if has_more else None
+    page = pd.DataFrame.from_records(
+        [tuple(row) for row in rows],
+        columns=["ID", "Date", "Category", "Amount", "Source"],
+    )
+    page["Amount"] = from_cents(page["Amount"])
+    return page, next_cursor
+
+
+# ---------- Budget engine ----------
+
+# Budgets are monthly. A period is split into whole months, answered from
+# monthly_rollup, and the partial months at its edges, answered from the
+# (date) index, so the cost depends on the period, not on the history size.
+# Budgets are prorated by the fraction of each month the period covers.
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def split_period(
+    start: date, end: date
+) -> Tuple[Optional[Tuple[str, str]], List[Tuple[str, str]], float]:
+    """Split [start, end] into (whole months, edge day ranges, budget months).
+
+    Whole months are a (first, last) pair of YYYY-MM keys or None; edge
+    ranges are inclusive YYYY-MM-DD pairs; budget months is how many monthly
+    budgets the period is worth.
+    """
+    if start > end:
+        raise ValueError(f"period starts after it ends: {start} > {end}")
+    months = 0.0
+    whole: List[date] = []
+    edges: List[Tuple[str, str]] = []
+    month = _month_start(start)
+    while month <= end:
+        following = _next_month(month)
+        first = max(month, start)
+        last = min(following - timedelta(days=1), end)
+        months += ((last - first).days + 1) / (following - month).days
+        if first == month and last == following - timedelta(days=1):
+            whole.append(month)
+        else:
+            edges.append((to_iso(first), to_iso(last)))
+        month = following
+    span = (whole[0].strftime("%Y-%m"), whole[-1].strftime("%Y-%m")) if whole else None
+    return span, edges, months
+
+
+def _variance_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Still in cents here, so Variance is exact; no budget gives a NaN %
+    df["Variance"] = df["Actual"] - df["Budget"]
+    df["Variance_%"] = df["Variance"] / df["Budget"].where(df["Budget"] > 0)
+    for column in ("Actual", "Budget", "Variance"):
+        df[column] = from_cents(df[column])
+    return df
+
+
+@timed("query")
+@snapshot_cache.memoize
+def budget_vs_actual(start=None, end=None) -> pd.DataFrame:
+    """Actual spend vs prorated budget per category over [start, end].
+
+    Open ends default to the first and last expense dates. Categories with
+    a budget but no spending are included with an Actual of 0. Raises
+    ValueError when ``start`` is after ``end``.
+    """
+    import pandas as pd
+
+    columns = ["Category", "Actual", "Budget", "Variance", "Variance_%"]
+    if start is not None and end is not None and _as_date(start) > _as_date(end):
+        raise ValueError(f"period starts after it ends: {to_iso(start)} > {to_iso(end)}")
+    with connection() as conn:
+        if start is None or end is None:
+            first, last = conn.execute("SELECT MIN(date), MAX(date) FROM expenses;").fetchone()
+            if first is None:
+                return pd.DataFrame(columns=columns)
+            start = first if start is None else start
+            end = last if end is None else end
+            # An open end can land on the wrong side of the given one, e.g.
+            # a start after the last expense: nothing was spent then.
+            if _as_date(start) > _as_date(end):
+                return pd.DataFrame(columns=columns)
+        span, edges, months = split_period(_as_date(start), _as_date(end))
+
+        parts, params = [], []
+        if span is not None:
+            parts.append(
+                "SELECT category, total_cents AS cents FROM monthly_rollup "
+                "WHERE month BETWEEN ? AND ?"
+            )
+            params.extend(span)
+        for first, last in edges:
+            parts.append(
+                "SELECT category, amount_cents AS cents FROM expenses "
+                "WHERE date BETWEEN ? AND ?"
+            )
+            params.extend((first, last))
+        df = pd.read_sql_query(
+            f"""
+            WITH actual AS (
+                SELECT category, SUM(cents) AS cents
+                FROM ({' UNION ALL '.join(parts)})
+                GROUP BY category
+            )
+            SELECT c.category AS Category,
+                   COALESCE(a.cents, 0) AS Actual,
+                   CAST(ROUND(COALESCE(b.monthly_budget_cents, 0) * ?) AS INTEGER) AS Budget
+            FROM (SELECT category FROM actual UNION SELECT category FROM budgets) AS c
+            LEFT JOIN actual AS a ON a.category = c.category
+            LEFT JOIN budgets AS b ON b.category = c.category
+            ORDER BY c.category;
+            """,
+            conn,
+            params=params + [months],
+        )
+    return _variance_frame(df)[columns]
+
+
+@timed("query")
+@snapshot_cache.memoize
+def budget_vs_actual_by_month(year: int, by: Optional[str] = None) -> pd.DataFrame:
+    """One row per month of ``year`` and category: Actual, Budget, Variance.
+
+    Only months within the ledger's range (first to last expense month)
+    are included, so months not yet reached don't count as underspent.
+    With ``by`` ("Month" or "Category") rows are summed per that column;
+    the sums are taken in cents, before the conversion to currency.
+    """
+    import pandas as pd
+
+    months = [f"{year:04d}-{month:02d}" for month in range(1, 13)]
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"""
+            WITH months (month) AS (VALUES {', '.join(['(?)'] * len(months))}),
+            ledger AS (
+                SELECT substr(MIN(date), 1, 7) AS first, substr(MAX(date), 1, 7) AS last
+                FROM expenses
+            ),
+            categories AS (
+                SELECT category FROM monthly_rollup WHERE month BETWEEN ? AND ?
+                UNION
+                SELECT category FROM budgets
+            )
+            SELECT m.month AS Month,
+                   c.category AS Category,
+                   COALESCE(r.total_cents, 0) AS Actual,
+                   COALESCE(b.monthly_budget_cents, 0) AS Budget
+            FROM months AS m
+            JOIN ledger AS l ON m.month BETWEEN l.first AND l.last
+            CROSS JOIN categories AS c
+            LEFT JOIN monthly_rollup AS r ON r.month = m.month AND r.category = c.category
+            LEFT JOIN budgets AS b ON b.category = c.category
+            ORDER BY m.month, c.category;
+            """,
+            conn,
+            params=months + [months[0], months[-1]],
+        )
+    df["Month"] = pd.to_datetime(df["Month"], format="%Y-%m")
+    if by is not None:
+        df = df.groupby(by, as_index=False)[["Actual", "Budget"]].sum()
+    return _variance_frame(df)
+
+
+@timed("query")
+@snapshot_cache.memoize
+def expense_years() -> List[int]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT substr(month, 1, 4) FROM monthly_rollup ORDER BY 1;"
+        ).fetchall()
+    return [int(row[0]) for row in rows if row[0].isdigit()]
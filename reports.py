@@ -0,0 +1,290 @@
+"""Headless monthly and per-category reports, rendered in parallel.
+
+Each ``ReportSpec`` is independent (its own ledger, period and output
+file), so a batch is spread over a process pool and finishes in about the
+time of its slowest report. Charts are drawn with the Agg backend through
+the chart service; nothing ever opens a window.
+"""
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+REPORT_KINDS = ("monthly", "category")
+REPORT_FORMATS = ("pdf", "png")
+DEFAULT_MONTHS_AHEAD = 3
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    db_path: str
+    kind: str
+    start_month: str
+    end_month: str
+    output_path: str
+    fmt: str = "pdf"
+    months_ahead: int = DEFAULT_MONTHS_AHEAD
+
+    @property
+    def ledger(self) -> str:
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+
+    @property
+    def period(self) -> tuple:
+        """(first day, last day) of the month range."""
+        start = date.fromisoformat(f"{self.start_month}-01")
+        end = date.fromisoformat(f"{self.end_month}-01")
+        end = (end.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return start, end
+
+
+def default_output_path(
+    out_dir: str, db_path: str, kind: str, start_month: str, end_month: str, fmt: str
+) -> str:
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    name = f"{stem}_{kind}_{start_month}_{end_month}"
+    # PNG reports are a directory of charts and tables
+    return os.path.join(out_dir, f"{name}.pdf" if fmt == "pdf" else name)
+
+
+# ---------- Sections ----------
+
+class Section:
+    """A titled block of lines, tables and PNG charts, output-agnostic."""
+
+    def __init__(self, title: str):
+        self.title = title
+        self.lines: List[str] = []
+        self.tables: List[tuple] = []
+        self.charts: List[tuple] = []
+
+    def line(self, text: str):
+        self.lines.append(text)
+
+    def table(self, name: str, df: pd.DataFrame):
+        self.tables.append((name, df))
+
+    def chart(self, name: str, png: bytes):
+        self.charts.append((name, png))
+
+
+def _money(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    for column in out.columns:
+        if column.endswith("%"):
+            out[column] = out[column].map(lambda v: "" if v != v else f"{v:.1%}")
+        elif out[column].dtype.kind == "f":
+            out[column] = out[column].map(lambda v: f"{v:,.2f}")
+    return out
+
+
+def monthly_sections(spec: ReportSpec) -> List[Section]:
+    import charts
+    import db
+    import queries
+    from forecasting import TOTAL_SERIES, forecast_all
+
+    start, end = spec.period
+    monthly = queries.monthly_totals(spec.start_month, spec.end_month)
+    summary = Section(f"Expense report: {spec.ledger}, {spec.start_month} to {spec.end_month}")
+    if monthly.empty:
+        summary.line("No expenses in this period.")
+        return [summary]
+
+    total = queries.total_spent(start, end)
+    monthly_budget = sum(db.load_budgets().values())
+    summary.line(f"Total spent: ${total:,.2f} over {queries.expense_count(start, end):,} expenses")
+    summary.line(f"Average per month: ${total / len(monthly):,.2f}")
+    month_table = monthly.assign(
+        Month=monthly["Month"].dt.strftime("%Y-%m"),
+        Budget=float(monthly_budget),
+        Variance=monthly["Amount"] - monthly_budget,
+    )
+    summary.table("Monthly totals", _money(month_table))
+    summary.chart("Monthly expenses", charts.monthly_bar_chart(monthly))
+
+    categories = Section("Spending by category")
+    variance = queries.budget_vs_actual(start, end)
+    categories.table("Budget vs actual (prorated)", _money(variance))
+    totals = queries.category_totals(start, end)
+    if not totals.empty:
+        categories.chart("Share by category", charts.category_pie_chart(totals))
+    categories.chart("Budget variance", charts.variance_bar_chart(variance))
+
+    outlook = Section("Forecast")
+    result = forecast_all(queries.monthly_category_totals(None, spec.end_month), spec.months_ahead)
+    metrics = result.metrics.loc[TOTAL_SERIES]
+    outlook.line(f"Train R2: {metrics['Train_R2']:.3f}")
+    if result.test_months:
+        outlook.line(f"Test MAE (last {result.test_months} months): ${metrics['Test_MAE']:,.2f}")
+    outlook.table("Predicted total", _money(result.series(TOTAL_SERIES)))
+    outlook.chart(
+        "Forecast", charts.forecast_chart(result.history, result.forecast, TOTAL_SERIES)
+    )
+    return [summary, categories, outlook]
+
+
+def category_sections(spec: ReportSpec) -> List[Section]:
+    import charts
+    import db
+    import queries
+    from forecasting import forecast_all
+
+    matrix = queries.monthly_category_totals(spec.start_month, spec.end_month)
+    header = Section(f"Category report: {spec.ledger}, {spec.start_month} to {spec.end_month}")
+    if matrix.empty:
+        header.line("No expenses in this period.")
+        return [header]
+
+    budgets = db.load_budgets()
+    result = forecast_all(queries.monthly_category_totals(None, spec.end_month), spec.months_ahead)
+    sections = [header]
+    for category in matrix.columns:
+        series = matrix[category]
+        section = Section(category)
+        section.line(f"Total: ${series.sum():,.2f}, average per month: ${series.mean():,.2f}")
+        budget = budgets.get(category)
+        if budget:
+            over = int((series > budget).sum())
+            section.line(
+                f"Monthly budget: ${budget:,.2f}, exceeded in {over} of {len(series)} months"
+            )
+        amounts = series.rename("Amount").rename_axis("Month").reset_index()
+        amounts["Month"] = amounts["Month"].dt.strftime("%Y-%m")
+        section.table("Monthly amounts", _money(amounts))
+        section.chart(
+            "Forecast", charts.forecast_chart(result.history, result.forecast, category)
+        )
+        sections.append(section)
+    return sections
+
+
+SECTION_BUILDERS = {"monthly": monthly_sections, "category": category_sections}
+
+
+# ---------- Output ----------
+
+def _latin1(text: str) -> str:
+    # The core PDF fonts only cover Latin-1
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+
+def write_pdf(sections: Sequence[Section], path: str):
+    try:
+        from fpdf import FPDF
+    except ImportError as exc:
+        raise RuntimeError("PDF reports need fpdf (pip install fpdf); use --format png") from exc
+    # Pillow comes with matplotlib
+    from PIL import Image
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=15)
+    with tempfile.TemporaryDirectory() as scratch:
+        for number, section in enumerate(sections):
+            pdf.add_page()
+            pdf.set_font("Helvetica", "B", 16)
+            pdf.cell(0, 10, _latin1(section.title), ln=1)
+            pdf.set_font("Helvetica", size=11)
+            for text in section.lines:
+                pdf.cell(0, 7, _latin1(text), ln=1)
+            for name, df in section.tables:
+                pdf.ln(3)
+                pdf.set_font("Helvetica", "B", 11)
+                pdf.cell(0, 7, _latin1(name), ln=1)
+                width = min(45, 190 / max(1, len(df.columns)))
+                pdf.set_font("Helvetica", "B", 9)
+                for column in df.columns:
+                    pdf.cell(width, 6, _latin1(column), border=1)
+                pdf.ln()
+                pdf.set_font("Helvetica", size=9)
+                for row in df.itertuples(index=False):
+                    for value in row:
+                        pdf.cell(width, 6, _latin1(value), border=1)
+                    pdf.ln()
+            for index, (name, png) in enumerate(section.charts):
+                # fpdf 1.7 only places images from files, and splits an alpha
+                # channel out pixel by pixel in Python; flattened RGB is
+                # embedded as is.
+                image = os.path.join(scratch, f"{number}_{index}.png")
+                Image.open(io.BytesIO(png)).convert("RGB").save(image)
+                pdf.ln(3)
+                pdf.image(image, w=170)
+        pdf.output(path)
+
+
+def write_png(sections: Sequence[Section], directory: str):
+    """Charts as PNG files and tables as CSV, one set per section."""
+    os.makedirs(directory, exist_ok=True)
+    lines = []
+    for number, section in enumerate(sections, 1):
+        lines.append(f"# {section.title}")
+        lines.extend(section.lines)
+        for index, (name, df) in enumerate(section.tables, 1):
+            df.to_csv(os.path.join(directory, f"{number:02d}_{index}_table.csv"), index=False)
+        for index, (name, png) in enumerate(section.charts, 1):
+            with open(os.path.join(directory, f"{number:02d}_{index}_chart.png"), "wb") as fh:
+                fh.write(png)
+    with open(os.path.join(directory, "summary.txt"), "w") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+# ---------- Running ----------
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def build_report(spec: ReportSpec) -> str:
+    """Render one report; returns the path written."""
+    import db
+
+    # init_db would create an empty ledger and report on that
+    if not os.path.exists(spec.db_path):
+        raise FileNotFoundError(f"no ledger at {spec.db_path}")
+    _init_worker()
+    db.DB_FILE = spec.db_path
+    db.init_db()
+    sections = SECTION_BUILDERS[spec.kind](spec)
+    if spec.fmt == "pdf":
+        write_pdf(sections, spec.output_path)
+    else:
+        write_png(sections, spec.output_path)
+    return spec.output_path
+
+
+def generate_reports(
+    specs: Sequence[ReportSpec], workers: Optional[int] = None
+) -> Dict[ReportSpec, Union[str, Exception]]:
+    """Render every spec, in parallel when there is more than one.
+
+    Maps each spec to the path written, or to the exception it raised, so
+    one broken ledger doesn't sink the rest of the batch.
+    """
+    workers = min(len(specs), workers or os.cpu_count() or 1)
+    results: Dict[ReportSpec, Union[str, Exception]] = {}
+    if workers <= 1:
+        for spec in specs:
+            try:
+                results[spec] = build_report(spec)
+            except Exception as exc:
+                results[spec] = exc
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {spec: pool.submit(build_report, spec) for spec in specs}
+        for spec, future in futures.items():
+            try:
+                results[spec] = future.result()
+            except Exception as exc:
+                results[spec] = exc
+    return results
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import writer  # noqa: E402
+
+
+@pytest.fixture
+def ledger_path(tmp_path, monkeypatch):
+    """A fresh database path set as db.DB_FILE; the file isn't created."""
+    path = str(tmp_path / "expenses.db")
+    monkeypatch.setattr(db, "DB_FILE", path)
+    yield path
+    writer.close_all_writers()
+    db.get_pool(path).close_all()
@@ -0,0 +1,89 @@
+"""Duplicate detection for re-imported statements (fingerprints + occurrence numbers)."""
+import io
+
+import numpy as np
+import pytest
+
+import db
+import import_jobs
+from csv_import import OccurrenceCounter
+
+FIRST_EXPORT = """Date,Description,Amount
+2024-03-01,STARBUCKS #12,4.50
+2024-03-01,STARBUCKS #12,4.50
+2024-03-02,FRESH GROCERY,52.10
+2024-03-03,UBER *TRIP,18.00
+"""
+# Overlaps FIRST_EXPORT from 2024-03-01 with different case and spacing, and
+# has a third identical coffee that day
+OVERLAPPING_EXPORT = """Date,Description,Amount
+2024-03-01,starbucks  #12,4.50
+2024-03-01,Starbucks #12,4.50
+2024-03-01,STARBUCKS #12,4.50
+2024-03-02,Fresh Grocery,52.10
+2024-03-03,UBER *TRIP,18.00
+2024-03-04,CITY POWER,90.00
+"""
+
+
+@pytest.fixture
+def ledger(ledger_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(import_jobs, "STAGING_DIR", str(tmp_path / "staging"))
+    db.init_db()
+    return ledger_path
+
+
+def run_import(text: str, account: str = "checking", chunksize: int = 2):
+    # Small chunks so repeats of one transaction straddle chunk boundaries
+    job_id = import_jobs.create_job(
+        io.BytesIO(text.encode()), "statement.csv", "Date", "Amount", "Description",
+        account, chunksize,
+    )
+    return import_jobs.run_job(job_id)
+
+
+def expense_count() -> int:
+    with db.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM expenses;").fetchone()[0]
+
+
+def test_occurrences_count_across_chunks():
+    counter = OccurrenceCounter()
+    try:
+        days = np.array([10, 10, 11], dtype=np.int64)
+        first = counter.number(days, np.array([7, 7, 8], dtype=np.uint64))
+        # Out of day order and with keys above the int64 range
+        days = np.array([11, 10, 10], dtype=np.int64)
+        second = counter.number(days, np.array([8, 7, 2**64 - 1], dtype=np.uint64))
+    finally:
+        counter.close()
+    assert first.tolist() == [0, 1, 0]
+    assert second.tolist() == [1, 2, 0]
+
+
+def test_reimporting_a_statement_adds_nothing(ledger):
+    assert run_import(FIRST_EXPORT).imported == 4
+    job = run_import(FIRST_EXPORT)
+    assert (job.imported, job.duplicates) == (0, 4)
+    assert expense_count() == 4
+
+
+def test_overlapping_export_adds_only_new_rows(ledger):
+    run_import(FIRST_EXPORT)
+    job = run_import(OVERLAPPING_EXPORT)
+    # The third coffee and the new bill are new; the rest match by
+    # normalized description and occurrence number
+    assert (job.imported, job.duplicates) == (2, 4)
+    assert expense_count() == 6
+
+
+def test_other_accounts_are_not_deduplicated(ledger):
+    run_import(FIRST_EXPORT, account="checking")
+    job = run_import(FIRST_EXPORT, account="credit card")
+    assert (job.imported, job.duplicates) == (4, 0)
+
+
+def test_chunk_size_does_not_change_fingerprints(ledger):
+    run_import(FIRST_EXPORT, chunksize=1)
+    job = run_import(FIRST_EXPORT, chunksize=50)
+    assert (job.imported, job.duplicates) == (0, 4)
@@ -0,0 +1,110 @@
+"""Upgrading a ledger created by the original app (REAL amounts, no user_version)."""
+import sqlite3
+
+import pytest
+
+import db
+
+# The schema the app created before migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    source TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+CREATE TABLE budgets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL UNIQUE,
+    monthly_budget REAL NOT NULL
+);
+"""
+
+# (id, date, category, amount); ids 2 and 6 are deleted before migrating
+BASELINE_EXPENSES = [
+    (1, "2024-01-03", "Food", 10.005),
+    (2, "2024-01-04", "Food", 3.0),
+    (3, "2024-01-15", "Food", 0.125),
+    (4, "2024-02-01", "Rent", 2.675),
+    (5, "2024-02-09", "Coffee", -1.005),
+    (6, "2024-02-10", "Coffee", 4.5),
+]
+EXPECTED_CENTS = {1: 1001, 3: 13, 4: 268, 5: -101}
+
+
+@pytest.fixture
+def migrated(ledger_path):
+    conn = sqlite3.connect(ledger_path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO expenses (id, date, category, amount, source) VALUES (?, ?, ?, ?, 'manual');",
+        BASELINE_EXPENSES,
+    )
+    conn.execute("DELETE FROM expenses WHERE id IN (2, 6);")
+    conn.executemany(
+        "INSERT INTO budgets (category, monthly_budget) VALUES (?, ?);",
+        [("Food", 250.005), ("Rent", 1200.1)],
+    )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    with db.connection() as conn:
+        yield conn
+
+
+def test_schema_version_is_current(migrated):
+    assert migrated.execute("PRAGMA user_version;").fetchone()[0] == db.SCHEMA_VERSION
+
+
+def test_amounts_become_cents_rounded_half_up(migrated):
+    rows = migrated.execute("SELECT id, amount_cents FROM expenses ORDER BY id;").fetchall()
+    assert {row["id"]: row["amount_cents"] for row in rows} == EXPECTED_CENTS
+    columns = [row["name"] for row in migrated.execute("PRAGMA table_info(expenses);")]
+    assert "amount" not in columns
+
+
+def test_budgets_become_cents(migrated):
+    rows = migrated.execute("SELECT category, monthly_budget_cents FROM budgets;").fetchall()
+    assert {row[0]: row[1] for row in rows} == {"Food": 25001, "Rent": 120010}
+
+
+def test_ids_and_sequence_survive(migrated):
+    seq = migrated.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses';").fetchone()
+    assert seq[0] == 6
+    # The deleted last id isn't handed out again
+    assert db.add_expense("2024-03-01", "Food", 1.0) == 7
+
+
+def test_rollup_matches_expenses(migrated):
+    rollup = migrated.execute(
+        "SELECT month, category, total_cents, count FROM monthly_rollup ORDER BY 1, 2;"
+    ).fetchall()
+    assert [tuple(row) for row in rollup] == [
+        ("2024-01", "Food", 1014, 2),
+        ("2024-02", "Coffee", -101, 1),
+        ("2024-02", "Rent", 268, 1),
+    ]
+    # The triggers were recreated with the table
+    db.add_expense("2024-02-20", "Rent", 0.5)
+    total = migrated.execute(
+        "SELECT total_cents FROM monthly_rollup WHERE month = '2024-02' AND category = 'Rent';"
+    ).fetchone()[0]
+    assert total == 318
+
+
+def test_indexes_are_rebuilt(migrated):
+    indexes = {
+        row["name"]
+        for row in migrated.execute("PRAGMA index_list(expenses);")
+        if not row["name"].startswith("sqlite_autoindex")
+    }
+    assert indexes == {
+        "idx_expenses_date",
+        "idx_expenses_category_date",
+        "idx_expenses_amount_cents",
+        "idx_expenses_category_amount_cents",
+        "idx_expenses_fingerprint",
+    }
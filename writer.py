@@ -0,0 +1,174 @@
+"""Single-writer group commit.
+
+Small writes from every thread (Streamlit sessions, import workers, the
+CLI) are queued to one writer thread per database. The writer applies
+whatever is pending in one transaction and commits once, so a burst of N
+writes costs one write-lock acquisition and one commit instead of N, and
+threads in this process never contend for SQLite's lock among themselves.
+
+Each write is a callable taking the connection. Callers get a Future that
+resolves (to the callable's return value) only after the batch holding it
+has committed durably: the writer's connection runs with synchronous=FULL,
+so each batch's commit syncs the WAL to disk once, however many writes it
+holds. A write that raises is rolled back to its own savepoint and fails
+only its own Future.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+# How long the writer waits for more writes after the first before it
+# commits. With 0 a batch is whatever queued up while the previous commit
+# ran, which is what blocking callers produce; raise it only for bursts of
+# fire-and-forget submits. MAX_BATCH caps the writes per transaction.
+GROUP_COMMIT_WINDOW_SECONDS = 0.0
+MAX_BATCH = 500
+# Pool connections use NORMAL, which under WAL can lose the last commits on
+# power failure; the writer acknowledges only synced batches.
+WRITER_SYNCHRONOUS = "FULL"
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        path: str,
+        window: float = GROUP_COMMIT_WINDOW_SECONDS,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.path = path
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: Callable) -> Future:
+        future: Future = Future()
+        self._queue.put((op, future))
+        return future
+
+    def close(self):
+        """Commit everything already queued, then stop the thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while batch[-1] is not _STOP and len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from db import CONNECTION_SYNCHRONOUS, get_pool
+
+        # One pool connection for the thread's life, so every batch (and any
+        # transaction() an op opens) runs on the connection set to FULL.
+        with get_pool(self.path).connection() as conn:
+            conn.execute(f"PRAGMA synchronous={WRITER_SYNCHRONOUS};")
+            try:
+                while True:
+                    batch = self._collect()
+                    ops = [item for item in batch if item is not _STOP]
+                    if ops:
+                        self._apply(ops)
+                    if batch[-1] is _STOP:
+                        return
+            finally:
+                # Back to the pool's setting before other threads reuse it
+                conn.execute(f"PRAGMA synchronous={CONNECTION_SYNCHRONOUS};")
+
+    def _apply(self, ops: list):
+        from db import bump_data_version, transaction
+
+        results = []
+        try:
+            with transaction(self.path) as conn:
+                for op, future in ops:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT group_write;")
+                    try:
+                        result = op(conn)
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO group_write;")
+                        conn.execute("RELEASE group_write;")
+                        future.set_exception(exc)
+                    else:
+                        conn.execute("RELEASE group_write;")
+                        results.append((future, result))
+                if results:
+                    bump_data_version(conn)
+        except Exception as exc:
+            # BEGIN or COMMIT failed: nothing in the batch was written
+            for _, future in ops:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, result in results:
+            future.set_result(result)
+
+
+_writers: Dict[str, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: str) -> WriteQueue:
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            if not _writers:
+                # Registered after db's pool cleanup, so it runs before it
+                atexit.register(close_all_writers)
+            writer = _writers[path] = WriteQueue(path)
+        return writer
+
+
+def close_all_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+def submit_write(op: Callable, path: Optional[str] = None) -> Future:
+    """Queue ``op(conn)`` on the database's writer; see the module docstring.
+
+    A thread that already holds a transaction on the database runs ``op``
+    inline in it instead: the writer would otherwise wait on the lock that
+    thread holds while the thread waits on the writer. That Future resolves
+    as soon as ``op`` has run; the write is committed with the caller's
+    transaction, at the pool's synchronous=NORMAL.
+    """
+    import db
+
+    path = path or db.DB_FILE
+    pool = db.get_pool(path)
+    if not pool.holds_transaction():
+        return get_writer(path).submit(op)
+
+    future: Future = Future()
+    with pool.transaction() as conn:
+        try:
+            future.set_result(op(conn))
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            db.bump_data_version(conn)
+    return future
+
+
+def write(op: Callable, path: Optional[str] = None):
+    """``submit_write`` and wait: returns once the write is committed."""
+    return submit_write(op, path).result()
+